@@ -5,6 +5,17 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Запуск под ASGI-сервером (async-представления из car_tuning/async_views.py
+не занимают поток на каждого медленного клиента):
+
+    uvicorn TUNING.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Каждый воркер держит свой пул соединений (DB_POOL_MAX_SIZE). Async-ответ
+модели автомобиля читает таблицы параллельно, но все async-представления
+процесса вместе держат не больше ASYNC_DB_CONCURRENCY соединений, остальные
+запросы ждут своей очереди. ASYNC_DB_CONCURRENCY должно быть заметно меньше
+DB_POOL_MAX_SIZE.
 """
 
 import os
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Триграммный поиск (car_tuning/search.py)
+    'django.contrib.postgres',
 
     'rest_framework',
 
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'car_tuning.snapshots.SnapshotMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,6 +94,50 @@ DATABASES = {
     }
 }
 
+# Соединения с базой. DB_POOL=True — пул psycopg 3 в каждом процессе (подходит
+# и для WSGI, и для ASGI); размер пула умножается на число процессов и должен
+# помещаться в max_connections Postgres. DB_POOL=False — постоянные соединения
+# на DB_CONN_MAX_AGE секунд (под ASGI ставьте 0). В обоих режимах соединение
+# проверяется перед использованием, оборванное заменяется новым
+DB_POOL = env.bool('DB_POOL', default=True)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            # Сколько секунд ждать свободного соединения, прежде чем вернуть ошибку
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+            'max_idle': env.int('DB_POOL_MAX_IDLE', default=300),
+            'max_lifetime': env.int('DB_POOL_MAX_LIFETIME', default=60 * 60),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+
+# Сколько запросов к базе async-представления (car_tuning/async_views.py)
+# выполняют одновременно в процессе; каждый держит своё соединение. Должно быть
+# заметно меньше DB_POOL_MAX_SIZE, чтобы остальным запросам хватало соединений
+ASYNC_DB_CONCURRENCY = env.int('ASYNC_DB_CONCURRENCY', default=4)
+
+# Общий для всех воркеров кэш. По умолчанию файловый; для нескольких серверов
+# задайте CACHE_URL, например redis://host:6379/1 или dbcache://catalog_cache
+# (таблицу создаёт manage.py createcachetable).
+# Блокировки сборки ответов каталога и буферов автосохранения держатся на
+# cache.add. В файловом кэше add не атомарен: два воркера могут взять одну
+# блокировку, и ответ соберут оба. Для production нужен Redis или Memcached
+# (или dbcache — там add опирается на первичный ключ таблицы)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='filecache:///var/tmp/tuning-cache?max_entries=100000'),
+}
+
+# Время жизни закэшированных ответов каталога (секунды).
+# Кэш сбрасывается сигналами при изменении данных, таймаут лишь страховка
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', default=60 * 60 * 24)
+# Локальный уровень кэша ответов каталога в памяти каждого процесса
+CATALOG_LOCAL_CACHE_MAX_BYTES = env.int('CATALOG_LOCAL_CACHE_MAX_BYTES', default=64 * 1024 * 1024)
+CATALOG_LOCAL_CACHE_TIMEOUT = env.int('CATALOG_LOCAL_CACHE_TIMEOUT', default=60)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -128,6 +175,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Передача 3D-моделей фронтовому серверу (см. car_tuning/assets.py):
+# '' — отдаёт Django, 'x-accel-redirect' — nginx, 'x-sendfile' — apache/lighttpd.
+# Для nginx нужен internal location с префиксом ASSET_ACCEL_REDIRECT_PREFIX,
+# смотрящий в MEDIA_ROOT. Django передаёт только несжатый файл; чтобы nginx
+# отдавал готовые варианты из build_compressed_variants с Content-Encoding и
+# Vary, в этом location включаются gzip_static on; и brotli_static on;
+# (модуль ngx_brotli). Вариант .zst так отдаёт только сам Django:
+#     location /protected-media/ {
+#         internal;
+#         alias /path/to/media/;
+#         gzip_static on;
+#         brotli_static on;
+#     }
+ASSET_SENDFILE = env('ASSET_SENDFILE', default='')
+ASSET_ACCEL_REDIRECT_PREFIX = env('ASSET_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -222,13 +285,51 @@ JAZZMIN_UI_TWEAKS = {
 }
 
 REST_FRAMEWORK = {
+    # OAuth2 (django-oauth-toolkit), python-social-auth и SimpleJWT:
+    # способ выбирается по виду заголовка Authorization
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
-        'drf_social_oauth2.authentication.SocialAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'car_tuning.authentication.DispatchingAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'car_tuning.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Размеры страниц курсорной пагинации (см. car_tuning/pagination.py),
+# клиент может запросить свой размер через ?page_size=, но не больше максимума
+CATALOG_PAGE_SIZE = env.int('CATALOG_PAGE_SIZE', default=50)
+CATALOG_MAX_PAGE_SIZE = env.int('CATALOG_MAX_PAGE_SIZE', default=200)
+CUSTOMIZATION_PAGE_SIZE = env.int('CUSTOMIZATION_PAGE_SIZE', default=20)
+
+# Сколько секунд процесс помнит проверенный токен (см. car_tuning/authentication.py);
+# на столько же может запоздать отзыв токена. 0 — проверять каждый запрос
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', default=60)
+
+# Поиск по каталогу (/api/search/): минимальная длина запроса,
+# количество результатов по умолчанию и максимум для ?limit=
+CATALOG_SEARCH_MIN_LENGTH = env.int('CATALOG_SEARCH_MIN_LENGTH', default=2)
+CATALOG_SEARCH_LIMIT = env.int('CATALOG_SEARCH_LIMIT', default=20)
+CATALOG_SEARCH_MAX_LIMIT = env.int('CATALOG_SEARCH_MAX_LIMIT', default=50)
+
+# Размер пачки строк при потоковой выгрузке каталога (/api/export/)
+CATALOG_EXPORT_CHUNK_SIZE = env.int('CATALOG_EXPORT_CHUNK_SIZE', default=500)
+
+# Статический снимок каталога (см. car_tuning/snapshots.py), собирается командой
+# build_catalog_snapshot. CATALOG_SNAPSHOT_MODE: '' — не использовать,
+# 'redirect' — перенаправлять на файлы по CATALOG_SNAPSHOT_URL (их отдаёт nginx),
+# 'serve' — отдавать файлы из Django
+CATALOG_SNAPSHOT_ROOT = env('CATALOG_SNAPSHOT_ROOT', default=os.path.join(BASE_DIR, 'snapshots'))
+CATALOG_SNAPSHOT_URL = env('CATALOG_SNAPSHOT_URL', default='/catalog-snapshots/')
+CATALOG_SNAPSHOT_BASE_URL = env('CATALOG_SNAPSHOT_BASE_URL', default='')
+CATALOG_SNAPSHOT_MODE = env('CATALOG_SNAPSHOT_MODE', default='')
+
+# Автосохранение кастомизаций (?autosave=1, см. car_tuning/autosave.py):
+# буфер записывается в базу через столько секунд после первого изменения
+# или после стольких изменений. Зависшие буферы записывает flush_autosave
+CUSTOMIZATION_AUTOSAVE_DELAY = env.int('CUSTOMIZATION_AUTOSAVE_DELAY', default=10)
+CUSTOMIZATION_AUTOSAVE_MAX_CHANGES = env.int('CUSTOMIZATION_AUTOSAVE_MAX_CHANGES', default=20)
+
 AUTHENTICATION_BACKENDS = (
     'social_core.backends.google.GoogleOAuth2',
     'drf_social_oauth2.backends.DjangoOAuth2',
@@ -304,6 +405,10 @@ CORS_ALLOW_HEADERS = [
     'accept-language',
     'cache-control',
     'pragma',
+    'if-none-match',
+    'if-modified-since',
+    'range',
+    'if-range',
 ]
 
 CORS_EXPOSE_HEADERS = [
@@ -312,6 +417,10 @@ CORS_EXPOSE_HEADERS = [
     'Access-Control-Allow-Origin',
     'Content-Type',
     'Cache-Control',
+    'ETag',
+    'Last-Modified',
+    'Accept-Ranges',
+    'Content-Range',
 ]
 
 CORS_ALLOW_CREDENTIALS = True
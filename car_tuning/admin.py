@@ -1,6 +1,9 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
 from django.contrib.contenttypes.admin import GenericTabularInline
+from .flags import resolve_coming_soon, flag_key, get_coming_soon
+from .images import thumbnail_url
 from .models import (
     ComingSoon, CarBrand, CarModel, Spoiler, Discs, Restyling,
     Bumper, RearBumper, SideSkirt, Tinting, Color, UserCarCustomization
@@ -16,6 +19,29 @@ class ComingSoonInline(GenericTabularInline):
     fields = ('coming_soon',)
 
 
+class ComingSoonChangeList(ChangeList):
+    """Загружает флаги «Скоро» для всей страницы списка одним запросом."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        flags = resolve_coming_soon(self.result_list)
+        for obj in self.result_list:
+            obj.coming_soon_value = flags[flag_key(obj)]
+
+
+class ComingSoonAdminMixin:
+    def get_changelist(self, request, **kwargs):
+        return ComingSoonChangeList
+
+    def get_coming_soon(self, obj):
+        if hasattr(obj, 'coming_soon_value'):
+            return obj.coming_soon_value
+        return get_coming_soon(obj)
+
+    get_coming_soon.boolean = True
+    get_coming_soon.short_description = "Скоро"
+
+
 @admin.register(CarBrand)
 class CarBrandAdmin(admin.ModelAdmin):
     list_display = ('name', 'display_logo', 'model_count')
@@ -23,19 +49,26 @@ class CarBrandAdmin(admin.ModelAdmin):
 
     def display_logo(self, obj):
         if obj.logo:
-            return format_html('<img src="{}" width="50" height="50" />', obj.logo.url)
+            return format_html(
+                '<img src="{}" width="50" height="50" />',
+                thumbnail_url(obj.logo.name) or obj.logo.url
+            )
         return "Нет логотипа"
 
     display_logo.short_description = "Логотип"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_model_count()
+
     def model_count(self, obj):
-        return obj.models.count()
+        return obj.model_count
 
     model_count.short_description = "Количество моделей"
+    model_count.admin_order_field = 'model_count'
 
 
 @admin.register(CarModel)
-class CarModelAdmin(admin.ModelAdmin):
+class CarModelAdmin(ComingSoonAdminMixin, admin.ModelAdmin):
     list_display = ('__str__', 'brand', 'display_preview', 'get_coming_soon')
     list_filter = ('brand',)
     search_fields = ('name', 'brand__name')
@@ -43,20 +76,16 @@ class CarModelAdmin(admin.ModelAdmin):
 
     def display_preview(self, obj):
         if obj.preview_image:
-            return format_html('<img src="{}" width="100" height="60" />', obj.preview_image.url)
+            return format_html(
+                '<img src="{}" width="100" height="60" />',
+                thumbnail_url(obj.preview_image.name) or obj.preview_image.url
+            )
         return "Нет превью"
 
     display_preview.short_description = "Превью"
 
-    def get_coming_soon(self, obj):
-        flag = obj.coming_soon_flag.first()
-        return flag.coming_soon if flag else False
-
-    get_coming_soon.boolean = True
-    get_coming_soon.short_description = "Скоро"
-
 
-class BaseCarPartAdmin(admin.ModelAdmin):
+class BaseCarPartAdmin(ComingSoonAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'display_image', 'order', 'get_coming_soon')
     list_filter = ('compatible_car_models', 'compatible_car_models__brand')
     search_fields = ('name',)
@@ -65,18 +94,14 @@ class BaseCarPartAdmin(admin.ModelAdmin):
 
     def display_image(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="100" height="60" />', obj.image.url)
+            return format_html(
+                '<img src="{}" width="100" height="60" />',
+                thumbnail_url(obj.image.name) or obj.image.url
+            )
         return "Нет изображения"
 
     display_image.short_description = "Изображение"
 
-    def get_coming_soon(self, obj):
-        flag = obj.coming_soon_flag.first()
-        return flag.coming_soon if flag else False
-
-    get_coming_soon.boolean = True
-    get_coming_soon.short_description = "Скоро"
-
 
 @admin.register(Spoiler)
 class SpoilerAdmin(BaseCarPartAdmin):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CarTuningConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'car_tuning'
+
+    def ready(self):
+        from . import signals  # noqa: F401
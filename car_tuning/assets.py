@@ -0,0 +1,256 @@
+"""
+Раздача 3D-моделей и других файлов каталога по адресам с хэшем содержимого.
+
+URL вида /api/assets/<digest>/<имя файла>: при смене содержимого меняется и адрес,
+поэтому ответ кэшируется клиентом и CDN навсегда (Cache-Control: immutable).
+Поддерживаются Range-запросы (докачка и потоковая загрузка GLB), а при
+ASSET_SENDFILE сама передача отдаётся фронтовому серверу через
+X-Accel-Redirect (nginx) или X-Sendfile (apache/lighttpd), и воркер не занят
+на всё время скачивания. Если клиент принимает сжатие и для файла есть
+заранее сжатый вариант (см. compression.py), отдаётся он. При ASSET_SENDFILE
+фронтовому серверу передаётся только сам файл, а сжатые варианты рядом с ним
+он выбирает сам (gzip_static/brotli_static в nginx, см. settings.py).
+"""
+import hashlib
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from .compression import SUFFIXES, choose_encoding
+from .fastpath import CatalogFileField
+from .storage import blob_hash
+
+
+DIGEST_KEY = 'asset:digest:{}'
+DIGEST_LENGTH = 16
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    '.glb': 'model/gltf-binary',
+    '.gltf': 'model/gltf+json',
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Хэши по (имя, размер, время изменения): файл, перезаписанный под тем же
+# именем (например, build_derivatives --force), получает новый хэш
+_digests = {}
+_DIGESTS_LIMIT = 4096
+
+
+def _file_version(name):
+    """(размер, время изменения) файла в хранилище или None, если файла нет."""
+    try:
+        size = default_storage.size(name)
+    except (OSError, SuspiciousFileOperation):
+        return None
+    try:
+        modified = default_storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = None
+    return size, modified
+
+
+def file_digest(name):
+    """Хэш содержимого файла из хранилища или None, если файла нет."""
+    sha256 = blob_hash(name)
+    if sha256 is not None:
+        # Имя blob уже содержит хэш содержимого — читать файл не нужно
+        return sha256[:DIGEST_LENGTH]
+
+    version = _file_version(name)
+    if version is None:
+        return None
+    memo_key = (name, *version)
+    digest = _digests.get(memo_key)
+    if digest is not None:
+        return digest
+
+    size, modified = version
+    key = DIGEST_KEY.format(f'{name}:{size}:{modified}')
+    digest = cache.get(key)
+    if digest is None:
+        try:
+            with default_storage.open(name, 'rb') as file:
+                hasher = hashlib.sha256()
+                for chunk in file.chunks(CHUNK_SIZE):
+                    hasher.update(chunk)
+        except (OSError, SuspiciousFileOperation):
+            return None
+        digest = hasher.hexdigest()[:DIGEST_LENGTH]
+        cache.set(key, digest, None)
+
+    if len(_digests) >= _DIGESTS_LIMIT:
+        _digests.clear()
+    _digests[memo_key] = digest
+    return digest
+
+
+def asset_url(name, digest=None):
+    """Адрес файла с хэшем содержимого (уже известным или из file_digest); если файл недоступен — None."""
+    if digest is None:
+        digest = file_digest(name)
+    if digest is None:
+        return None
+    return reverse('catalog-asset', kwargs={'digest': digest, 'name': name})
+
+
+class AssetFileField(CatalogFileField):
+    """Файловое поле, которое отдаёт адрес /api/assets/<digest>/... вместо MEDIA_URL."""
+
+    def fast_representation(self, value, context):
+        if not value:
+            return None
+        url = asset_url(value.name)
+        if url is None:
+            # Файла нет в хранилище — оставляем обычный адрес
+            return super().fast_representation(value, context)
+        request = context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+def content_type(name):
+    for extension, value in CONTENT_TYPES.items():
+        if name.lower().endswith(extension):
+            return value
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def parse_range(header, size):
+    """
+    Диапазон (start, end) включительно из заголовка Range.
+    None — заголовок не поддерживается и отдаётся весь файл
+    (несколько диапазонов, другая единица), False — диапазон вне файла.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N — последние N байт
+        length = int(end)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _offload(name):
+    """
+    Ответ с передачей файла фронтовому серверу или None, если она выключена.
+    Передаётся только несжатый файл: Content-Encoding и Vary для сжатого
+    варианта фронтовой сервер выставляет сам, выбирая .br/.gz рядом с файлом.
+    """
+    mode = settings.ASSET_SENDFILE
+    if not mode:
+        return None
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        # nginx сам обработает Range по своему internal location
+        response['X-Accel-Redirect'] = settings.ASSET_ACCEL_REDIRECT_PREFIX + quote(name)
+    elif mode == 'x-sendfile':
+        try:
+            response['X-Sendfile'] = default_storage.path(name)
+        except NotImplementedError:
+            # Удалённое хранилище — отдаём сами
+            return None
+    else:
+        raise ValueError(f"Unknown ASSET_SENDFILE mode: {mode!r}")
+    return response
+
+
+@require_safe
+def serve_asset(request, digest, name):
+    current = file_digest(name)
+    if current is None or current != digest:
+        raise Http404("Файл не найден")
+
+    offloaded = bool(settings.ASSET_SENDFILE)
+    # Сжатый вариант при передаче фронтовому серверу выбирает он сам
+    encoding = None if offloaded else choose_encoding(name, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    # У каждого варианта своё представление, а значит и свой ETag
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+    else:
+        response = _offload(name) if offloaded else None
+        if response is None:
+            response = _file_response(request, name, encoding, etag)
+        response['Content-Type'] = content_type(name)
+        response['Accept-Ranges'] = 'bytes'
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _file_response(request, name, encoding, etag):
+    stored_name = name + SUFFIXES[encoding] if encoding else name
+    try:
+        file = default_storage.open(stored_name, 'rb')
+        size = default_storage.size(stored_name)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404("Файл не найден")
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range с чужим ETag или датой — клиент держит другую версию, отдаём файл целиком
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(file)
+        response['Content-Length'] = size
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(file, start, length), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
@@ -0,0 +1,134 @@
+"""
+Async-версии детального ответа модели автомобиля и compatible_parts
+для запуска под ASGI (см. TUNING/asgi.py).
+
+Async ORM Django выполняет запросы по очереди в одном общем потоке,
+поэтому здесь каждый запрос уходит в отдельный поток (sync_to_async с
+thread_sensitive=False) со своим соединением из пула: таблицы деталей,
+цвета и сама модель читаются параллельно, а не восемью запросами подряд.
+Одновременно в процессе выполняется не больше ASYNC_DB_CONCURRENCY таких
+запросов: остальные ждут, не занимая соединений, поэтому несколько
+одновременных промахов кэша не выбирают весь пул.
+Ответы, ?fields= / ?expand= (см. fieldsets.py) и кэш те же, что у CarModelViewSet.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .cache import STALE, car_model_cache, request_variant
+from .conditional import async_catalog_condition, mark_stale
+from .fieldsets import FieldSelection
+from .loaders import (
+    COMPATIBLE_PARTS, compatible_part_querysets, compatible_part_flags, group_compatible_parts, load_colors
+)
+from .models import CarModel
+from .renderers import FastJSONRenderer
+from .serializers import CarModelSerializer
+from .views import CarModelViewSet
+
+
+# Семафор привязывается к циклу событий при первом использовании
+db_slots = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+
+
+async def in_thread(func, *args):
+    """Выполняет func в отдельном потоке; соединение потока затем возвращается в пул."""
+    def call():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    async with db_slots:
+        return await sync_to_async(call, thread_sensitive=False)()
+
+
+async def load_compatible_parts_async(car_model_id, keys):
+    querysets = compatible_part_querysets([car_model_id], keys)
+    results = await asyncio.gather(*(in_thread(list, queryset) for queryset in querysets.values()))
+    rows = dict(zip(querysets, results))
+    # Флаги зависят от найденных деталей, поэтому загружаются вторым шагом
+    grouped = await in_thread(lambda: group_compatible_parts([car_model_id], rows, compatible_part_flags(rows)))
+    return grouped[car_model_id]
+
+
+def serialize_car_model(request, pk, fields):
+    queryset = CarModelViewSet.queryset if fields is None or 'brand' in fields else CarModel.objects.all()
+    car_model = queryset.filter(pk=pk).first()
+    if car_model is None:
+        raise Http404
+    return CarModelSerializer(car_model, detail=True, fields=fields, context={'request': request}).data
+
+
+def car_model_exists(pk):
+    if not CarModel.objects.filter(pk=pk).exists():
+        raise Http404
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def field_selection(request, field_names, group_names):
+    try:
+        return FieldSelection.from_request(request, field_names, group_names), None
+    except ValidationError as exc:
+        return None, json_response(exc.detail, status=400)
+
+
+async def cached_response(request, pk, kind, build):
+    try:
+        data, state = await car_model_cache.aget_or_build(pk, kind, request_variant(request), build)
+    except Http404:
+        return json_response({'detail': str(NotFound.default_detail)}, status=404)
+    response = json_response(data)
+    response['X-Cache'] = state
+    if state == STALE:
+        mark_stale(response)
+    return response
+
+
+@require_safe
+@async_catalog_condition
+async def car_model_detail(request, pk):
+    selection, error = field_selection(
+        request, CarModelSerializer.get_field_names_for(detail=True), tuple(COMPATIBLE_PARTS)
+    )
+    if error is not None:
+        return error
+
+    async def build():
+        data, parts = await asyncio.gather(
+            in_thread(serialize_car_model, request, pk, selection.fields),
+            load_compatible_parts_async(pk, selection.groups),
+        )
+        data.update(parts)
+        return data
+
+    return await cached_response(request, pk, selection.cache_kind('detail'), build)
+
+
+@require_safe
+@async_catalog_condition
+async def car_model_compatible_parts(request, pk):
+    selection, error = field_selection(request, ('colors',), tuple(COMPATIBLE_PARTS))
+    if error is not None:
+        return error
+    with_colors = selection.fields is None or 'colors' in selection.fields
+
+    async def build():
+        _, data, colors = await asyncio.gather(
+            in_thread(car_model_exists, pk),
+            load_compatible_parts_async(pk, selection.groups),
+            in_thread(load_colors) if with_colors else asyncio.sleep(0),
+        )
+        if with_colors:
+            data['colors'] = colors
+        return data
+
+    return await cached_response(request, pk, selection.cache_kind('compatible_parts'), build)
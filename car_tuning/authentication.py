@@ -0,0 +1,116 @@
+"""
+Аутентификация с выбором способа по виду заголовка Authorization.
+
+Раньше каждый запрос проходил OAuth2Authentication, SocialAuthentication и
+JWTAuthentication по очереди, и OAuth2 искал в базе любой Bearer-токен.
+Теперь способ выбирается по заголовку:
+
+    нет заголовка                 — аноним (или OAuth2 для ?access_token=)
+    Bearer <header.payload.sign>  — SimpleJWT
+    Bearer <токен>                — OAuth2 (django-oauth-toolkit)
+    Bearer <backend> <токен>      — python-social-auth
+
+Успешная проверка запоминается в памяти процесса на AUTH_TOKEN_CACHE_TIMEOUT
+секунд, но не дольше срока действия токена: повторные запросы с тем же
+заголовком не ищут токен и пользователя в базе. Запись годна, пока у
+пользователя не сменилась версия в общем кэше: её меняет любое сохранение
+или удаление пользователя (сигналы), так что блокировка (is_active=False)
+действует сразу во всех процессах. Отозванный токен перестаёт действовать
+не позже, чем через таймаут.
+"""
+import hashlib
+import pickle
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from drf_social_oauth2.authentication import SocialAuthentication
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .cache import LocalCache, _new_version
+
+
+JWT_RE = re.compile(rb'^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]*$')
+TOKEN_CACHE_MAX_BYTES = 8 * 1024 * 1024
+USER_VERSION_KEY = 'auth:user:{}:version'
+
+verified_tokens = LocalCache(TOKEN_CACHE_MAX_BYTES, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def user_version(user_id):
+    return cache.get(USER_VERSION_KEY.format(user_id))
+
+
+def invalidate_user_tokens(user_id):
+    """Запомненные проверки токенов пользователя перестают действовать во всех процессах."""
+    cache.set(USER_VERSION_KEY.format(user_id), _new_version(), None)
+
+
+class DispatchingAuthentication(BaseAuthentication):
+    def __init__(self):
+        self.oauth2 = OAuth2Authentication()
+        self.social = SocialAuthentication()
+        self.jwt = JWTAuthentication()
+
+    def select(self, request, header):
+        if not header:
+            # oauthlib принимает токен и из параметра access_token
+            return self.oauth2 if 'access_token' in request.query_params else None
+
+        parts = header.split()
+        # Заголовок из одних пробелов — как его отсутствие
+        if not parts or parts[0].lower() != b'bearer':
+            return None
+        if len(parts) == 2:
+            return self.jwt if JWT_RE.match(parts[1]) else self.oauth2
+        # Bearer <backend> <токен>; ошибки формата заголовка тоже сообщает SocialAuthentication
+        return self.social
+
+    def authenticate(self, request):
+        header = get_authorization_header(request)
+        authenticator = self.select(request, header)
+        if authenticator is None:
+            return None
+
+        key = hashlib.sha256(header or request.query_params['access_token'].encode()).hexdigest()
+        cached = verified_tokens.get(key)
+        if cached is not None:
+            result, version = pickle.loads(cached)
+            if result[0].is_active and user_version(result[0].pk) == version:
+                return result
+            # Пользователь изменился — проверяем токен заново
+
+        result = authenticator.authenticate(request)
+        if result is None:
+            if header:
+                # Раньше неверный Bearer-токен отклонял SocialAuthentication
+                raise AuthenticationFailed('Invalid token.')
+            return None
+        if not result[0].is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+
+        timeout = self.token_lifetime(result[1])
+        if settings.AUTH_TOKEN_CACHE_TIMEOUT and timeout > 0:
+            entry = (result, user_version(result[0].pk))
+            verified_tokens.set(key, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), timeout)
+        return result
+
+    def token_lifetime(self, token):
+        """Сколько секунд токен ещё действителен (для токена без срока — таймаут кэша)."""
+        expires = getattr(token, 'expires', None)
+        if expires is not None:
+            # AccessToken django-oauth-toolkit
+            return (expires - timezone.now()).total_seconds()
+        payload = getattr(token, 'payload', None)
+        if payload is not None and 'exp' in payload:
+            # Токен SimpleJWT
+            return payload['exp'] - time.time()
+        return settings.AUTH_TOKEN_CACHE_TIMEOUT
+
+    def authenticate_header(self, request):
+        return self.oauth2.authenticate_header(request)
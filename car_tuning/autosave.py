@@ -0,0 +1,184 @@
+"""
+Буфер автосохранения кастомизаций в общем кэше.
+
+В режиме автосохранения (?autosave=1) изменения из конфигуратора не пишутся
+в базу сразу, а копятся в кэше по кастомизации и записываются одним UPDATE:
+когда с первого изменения прошло CUSTOMIZATION_AUTOSAVE_DELAY секунд, когда
+накопилось CUSTOMIZATION_AUTOSAVE_MAX_CHANGES изменений, по действию commit
+или командой flush_autosave (для кастомизаций, которые больше не меняют).
+Чтение накладывает ещё не записанные изменения на объект из базы.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .models import UserCarCustomization
+
+
+logger = logging.getLogger(__name__)
+
+
+PENDING_KEY = 'customization:{}:autosave'
+LOCK_KEY = 'customization:{}:autosave:lock'
+INDEX_KEY = 'customization:autosave:index'
+INDEX_LOCK_KEY = 'customization:autosave:index:lock'
+
+LOCK_TIMEOUT = 5
+# Несохранённые изменения живут в кэше не дольше суток
+PENDING_TIMEOUT = 60 * 60 * 24
+
+
+class AutosaveBusy(APIException):
+    status_code = 409
+    default_detail = 'Кастомизация сейчас сохраняется, повторите запрос.'
+    default_code = 'autosave_busy'
+
+
+@contextmanager
+def cache_lock(key):
+    """
+    Короткая блокировка через cache.add. Блокировка сама истекает через
+    LOCK_TIMEOUT; если за это время её не удалось взять, AutosaveBusy.
+    """
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    acquired = cache.add(key, 1, LOCK_TIMEOUT)
+    while not acquired:
+        if time.monotonic() >= deadline:
+            raise AutosaveBusy()
+        time.sleep(0.005)
+        acquired = cache.add(key, 1, LOCK_TIMEOUT)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def _attname(field_name):
+    return UserCarCustomization._meta.get_field(field_name).attname
+
+
+def to_stored(value):
+    return value.pk if isinstance(value, models.Model) else value
+
+
+def apply_changes(customization, changes):
+    """Присваивает изменения {поле: значение или id} объекту без записи в базу."""
+    for name, value in changes.items():
+        setattr(customization, _attname(name), to_stored(value))
+    return customization
+
+
+class AutosaveBuffer:
+    def pending(self, customization_id):
+        """{поле: значение} ещё не записанных изменений (у связей — id)."""
+        entry = cache.get(PENDING_KEY.format(customization_id))
+        return entry['changes'] if entry else {}
+
+    def stage(self, customization_id, changes):
+        """
+        Добавляет изменения в буфер. Возвращает время записи (updated_at),
+        если порог достигнут и буфер уже записан в базу, иначе None.
+        """
+        changes = {name: to_stored(value) for name, value in changes.items()}
+        key = PENDING_KEY.format(customization_id)
+        with cache_lock(LOCK_KEY.format(customization_id)):
+            entry = cache.get(key) or {'changes': {}, 'since': time.time(), 'count': 0}
+            entry['changes'].update(changes)
+            entry['count'] += 1
+            cache.set(key, entry, PENDING_TIMEOUT)
+
+        if (
+            entry['count'] >= settings.CUSTOMIZATION_AUTOSAVE_MAX_CHANGES
+            or time.time() - entry['since'] >= settings.CUSTOMIZATION_AUTOSAVE_DELAY
+        ):
+            try:
+                return self.flush(customization_id)
+            except AutosaveBusy:
+                # Буфер уже записывает другой запрос; изменения остаются в буфере
+                return None
+
+        if entry['count'] == 1:
+            with cache_lock(INDEX_LOCK_KEY):
+                index = cache.get(INDEX_KEY) or {}
+                index[customization_id] = entry['since']
+                cache.set(INDEX_KEY, index, None)
+        return None
+
+    def flush(self, customization_id):
+        """
+        Записывает накопленные изменения одним UPDATE. Возвращает updated_at или None.
+        Буфер удаляется только после коммита: при откате изменения остаются в кэше.
+        """
+        key = PENDING_KEY.format(customization_id)
+        with cache_lock(LOCK_KEY.format(customization_id)):
+            entry = cache.get(key)
+            if not entry:
+                self._unindex(customization_id)
+                return None
+            updated_at = timezone.now()
+            fields = {_attname(name): value for name, value in entry['changes'].items()}
+            with transaction.atomic():
+                UserCarCustomization.objects.filter(pk=customization_id).update(**fields, updated_at=updated_at)
+                transaction.on_commit(lambda: self._discard(customization_id, entry['count']))
+        return updated_at
+
+    def _discard(self, customization_id, count):
+        """Удаляет записанный буфер, если в него ничего не добавили после записи."""
+        key = PENDING_KEY.format(customization_id)
+        try:
+            with cache_lock(LOCK_KEY.format(customization_id)):
+                entry = cache.get(key)
+                if entry and entry['count'] != count:
+                    # Новые изменения запишутся следующим flush вместе с уже записанными
+                    return
+                cache.delete(key)
+                self._unindex(customization_id)
+        except AutosaveBusy:
+            # Буфер останется и будет записан ещё раз; повторная запись тех же значений безвредна
+            pass
+
+    def _unindex(self, customization_id):
+        with cache_lock(INDEX_LOCK_KEY):
+            index = cache.get(INDEX_KEY) or {}
+            if index.pop(customization_id, None) is not None:
+                cache.set(INDEX_KEY, index, None)
+
+    def flush_due(self, delay=None):
+        """
+        Записывает буферы старше delay секунд (по умолчанию CUSTOMIZATION_AUTOSAVE_DELAY),
+        каждую кастомизацию в своей транзакции. Занятые и неудачные остаются до следующего запуска.
+        """
+        delay = settings.CUSTOMIZATION_AUTOSAVE_DELAY if delay is None else delay
+        now = time.time()
+        index = cache.get(INDEX_KEY) or {}
+        flushed = []
+        for customization_id, since in index.items():
+            if now - since < delay:
+                continue
+            try:
+                if self.flush(customization_id):
+                    flushed.append(customization_id)
+            except AutosaveBusy:
+                continue
+            except DatabaseError:
+                logger.exception("Не удалось записать автосохранение кастомизации %s", customization_id)
+        return flushed
+
+    def overlay(self, customization):
+        """Накладывает несохранённые изменения на объект из базы."""
+        return apply_changes(customization, self.pending(customization.pk))
+
+    def overlay_many(self, customizations):
+        keys = {PENDING_KEY.format(obj.pk): obj for obj in customizations}
+        for key, entry in cache.get_many(list(keys)).items():
+            apply_changes(keys[key], entry['changes'])
+        return customizations
+
+
+autosave_buffer = AutosaveBuffer()
@@ -0,0 +1,23 @@
+"""
+Фоновая обработка загруженных файлов (сжатие, превью) в потоке процесса.
+Задачи не переживают перезапуск процесса: пропущенное доделывают
+команды build_compressed_variants и build_image_derivatives.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media')
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Фоновая задача %s%r завершилась ошибкой", func.__name__, args)
+
+
+def run_in_background(func, *args):
+    return _executor.submit(_run, func, args)
@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_REVISION_KEY = 'catalog:revision'
+CAR_MODEL_VERSION_KEY = 'catalog:car_model:{}:version'
+PAYLOAD_KEY = 'catalog:{catalog_version}:car_model:{car_model_id}:{model_version}:{kind}:{variant}'
+# Последний собранный ответ без версий — отдаётся, пока другой воркер собирает новый
+STALE_KEY = 'catalog:stale:car_model:{car_model_id}:{kind}:{variant}'
+BUILD_LOCK_KEY = '{}:lock'
+STATS_KEYS = {'hits': 'catalog:stats:hits', 'misses': 'catalog:stats:misses', 'stale': 'catalog:stats:stale'}
+
+HIT, MISS, STALE = 'HIT', 'MISS', 'STALE'
+# Блокировка сборки истекает сама, если собиравший воркер упал
+BUILD_LOCK_TIMEOUT = 30
+# Сколько ждать чужой сборки, когда устаревшего ответа нет; потом собираем сами.
+# Сборка обычно укладывается в десятки миллисекунд, а дольше держать воркер незачем
+BUILD_WAIT_TIMEOUT = 0.5
+BUILD_WAIT_INTERVAL = 0.05
+# Счётчики статистики копятся в памяти процесса и сбрасываются в общий кэш
+# не чаще этого интервала (секунды), а не отдельным incr на каждый запрос
+STATS_FLUSH_INTERVAL = 10
+
+
+def _new_version():
+    # Версия — метка времени, а не счётчик: после вытеснения ключа версии
+    # из кэша новая версия не совпадёт ни с одной из старых
+    return str(time.time_ns())
+
+
+def catalog_revision():
+    """
+    Дешёвый маркер изменений всего каталога: (версия, время последнего изменения).
+    Меняется при любой правке каталога, см. touch_catalog().
+    """
+    revision = cache.get(CATALOG_REVISION_KEY)
+    if revision is None:
+        cache.add(CATALOG_REVISION_KEY, (_new_version(), timezone.now().replace(microsecond=0)), None)
+        revision = cache.get(CATALOG_REVISION_KEY)
+    return revision
+
+
+def touch_catalog():
+    """
+    Меняет маркер после коммита текущей транзакции (вне транзакции — сразу).
+    Иначе запрос до коммита получит старое тело под новым ETag, и на него
+    будут приходить 304 до следующей правки.
+    """
+    transaction.on_commit(_touch_catalog)
+
+
+def _touch_catalog():
+    changed_at = timezone.now().replace(microsecond=0)
+    previous = cache.get(CATALOG_REVISION_KEY)
+    if previous is not None and changed_at <= previous[1]:
+        # Last-Modified имеет точность до секунды: две правки в одну секунду
+        # не должны давать одинаковое время, иначе If-Modified-Since вернёт 304
+        changed_at = previous[1] + timedelta(seconds=1)
+    cache.set(CATALOG_REVISION_KEY, (_new_version(), changed_at), None)
+
+
+def request_variant(request):
+    """
+    Сериализаторы строят абсолютные URL файлов по хосту запроса,
+    поэтому закэшированный ответ зависит от схемы и хоста.
+    """
+    base_uri = request.build_absolute_uri('/')
+    return hashlib.md5(base_uri.encode()).hexdigest()[:12]
+
+
+class LocalCache:
+    """
+    LRU-кэш в памяти процесса с TTL и ограничением суммарного размера
+    (размер значения — длина его pickle). Значения отдаются без копирования,
+    их нельзя изменять.
+    """
+
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # {ключ: (значение, размер, истекает)}
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, timeout=None):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + timeout)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        value, size, expires = self._entries.pop(key)
+        self._size -= size
+
+
+class CarModelResponseCache:
+    """
+    Кэш сериализованных ответов по моделям автомобилей.
+    Ключ ответа содержит общую версию каталога и версию конкретной модели:
+    смена версии модели сбрасывает только её ответы, смена версии каталога — все.
+
+    Два уровня: LRU в памяти процесса и общий кэш (CACHES). Версии всегда
+    читаются из общего кэша, поэтому локальная копия не переживает правку.
+    При промахе ответ собирает только воркер, взявший блокировку; остальные
+    получают предыдущий ответ (STALE), а если его нет — недолго ждут сборки
+    и собирают сами. Блокировка — cache.add, атомарный только в Redis и
+    Memcached (см. CACHES в settings.py).
+    """
+
+    def __init__(self):
+        self.local = LocalCache(settings.CATALOG_LOCAL_CACHE_MAX_BYTES, settings.CATALOG_LOCAL_CACHE_TIMEOUT)
+        self._counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def _versions(self, car_model_id):
+        version_key = CAR_MODEL_VERSION_KEY.format(car_model_id)
+        versions = cache.get_many([CATALOG_VERSION_KEY, version_key])
+
+        catalog_version = versions.get(CATALOG_VERSION_KEY)
+        if catalog_version is None:
+            cache.add(CATALOG_VERSION_KEY, _new_version(), None)
+            catalog_version = cache.get(CATALOG_VERSION_KEY)
+
+        model_version = versions.get(version_key)
+        if model_version is None:
+            cache.add(version_key, _new_version(), None)
+            model_version = cache.get(version_key)
+
+        return catalog_version, model_version
+
+    def _payload_key(self, car_model_id, kind, variant):
+        catalog_version, model_version = self._versions(car_model_id)
+        return PAYLOAD_KEY.format(
+            catalog_version=catalog_version,
+            car_model_id=car_model_id,
+            model_version=model_version,
+            kind=kind,
+            variant=variant,
+        )
+
+    def _lookup(self, key):
+        payload = self.local.get(key)
+        if payload is None:
+            payload = cache.get(key)
+            if payload is not None:
+                self.local.set(key, payload)
+        return payload
+
+    def _claim(self, key, stale_key):
+        """
+        (payload, состояние, взята ли блокировка сборки). payload — None,
+        если ответа нет и его нужно собрать (под блокировкой или после ожидания).
+        """
+        payload = self._lookup(key)
+        if payload is not None:
+            return payload, HIT, False
+
+        if cache.add(BUILD_LOCK_KEY.format(key), 1, BUILD_LOCK_TIMEOUT):
+            return None, MISS, True
+        payload = cache.get(stale_key)
+        if payload is not None:
+            return payload, STALE, False
+        return None, MISS, False
+
+    def _store(self, key, stale_key, payload):
+        cache.set_many({key: payload, stale_key: payload}, settings.CATALOG_CACHE_TIMEOUT)
+        self.local.set(key, payload)
+
+    def _release(self, key):
+        cache.delete(BUILD_LOCK_KEY.format(key))
+
+    def _count_state(self, state):
+        self._count({HIT: 'hits', MISS: 'misses', STALE: 'stale'}[state])
+
+    def get_or_build(self, car_model_id, kind, variant, build):
+        """
+        Возвращает (payload, HIT | MISS | STALE). build() вызывается только при промахе.
+        """
+        key = self._payload_key(car_model_id, kind, variant)
+        stale_key = STALE_KEY.format(car_model_id=car_model_id, kind=kind, variant=variant)
+        payload, state, locked = self._claim(key, stale_key)
+        if payload is None and not locked:
+            # Ответ собирает другой воркер, а старого нет — ждём его сборки
+            payload = self._wait(key)
+            state = HIT if payload is not None else MISS
+        self._count_state(state)
+        if payload is not None:
+            return payload, state
+
+        try:
+            payload = build()
+            self._store(key, stale_key, payload)
+        finally:
+            if locked:
+                self._release(key)
+        return payload, MISS
+
+    def _wait(self, key):
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(BUILD_WAIT_INTERVAL)
+            payload = self._lookup(key)
+            if payload is not None:
+                return payload
+        return None
+
+    async def aget_or_build(self, car_model_id, kind, variant, build):
+        """get_or_build() для async-представлений: build — корутинная функция."""
+        key = await sync_to_async(self._payload_key)(car_model_id, kind, variant)
+        stale_key = STALE_KEY.format(car_model_id=car_model_id, kind=kind, variant=variant)
+        payload, state, locked = await sync_to_async(self._claim)(key, stale_key)
+        if payload is None and not locked:
+            payload = await self._await(key)
+            state = HIT if payload is not None else MISS
+        await sync_to_async(self._count_state)(state)
+        if payload is not None:
+            return payload, state
+
+        try:
+            payload = await build()
+            await sync_to_async(self._store)(key, stale_key, payload)
+        finally:
+            if locked:
+                await sync_to_async(self._release)(key)
+        return payload, MISS
+
+    async def _await(self, key):
+        deadline = time.monotonic() + BUILD_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(BUILD_WAIT_INTERVAL)
+            payload = await sync_to_async(self._lookup)(key)
+            if payload is not None:
+                return payload
+        return None
+
+    def invalidate(self, car_model_ids):
+        # Даже если ни одна модель не затронута, изменились списки каталога
+        touch_catalog()
+        car_model_ids = set(car_model_ids)
+        if car_model_ids:
+            cache.set_many(
+                {CAR_MODEL_VERSION_KEY.format(pk): _new_version() for pk in car_model_ids},
+                None,
+            )
+
+    def invalidate_all(self):
+        touch_catalog()
+        cache.set(CATALOG_VERSION_KEY, _new_version(), None)
+
+    def _count(self, name):
+        with self._counts_lock:
+            self._counts[name] += 1
+            if time.monotonic() - self._flushed_at < STATS_FLUSH_INTERVAL:
+                return
+        self.flush_stats()
+
+    def flush_stats(self):
+        """Переносит счётчики процесса в общий кэш."""
+        with self._counts_lock:
+            counts, self._counts = self._counts, Counter()
+            self._flushed_at = time.monotonic()
+        for name, count in counts.items():
+            key = STATS_KEYS[name]
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+    def stats(self):
+        """Статистика всех процессов; у других процессов — на момент их последнего сброса."""
+        self.flush_stats()
+        values = cache.get_many(list(STATS_KEYS.values()))
+        stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+        total = stats['hits'] + stats['misses'] + stats['stale']
+        # Устаревший ответ тоже избавил от сборки
+        stats['hit_ratio'] = (stats['hits'] + stats['stale']) / total if total else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._counts_lock:
+            self._counts.clear()
+        cache.delete_many(list(STATS_KEYS.values()))
+
+
+car_model_cache = CarModelResponseCache()
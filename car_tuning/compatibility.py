@@ -0,0 +1,71 @@
+"""
+Индекс совместимости деталей с моделями автомобилей в памяти процесса.
+
+Строится из промежуточных таблиц compatible_car_models (по запросу на тип
+детали) и отвечает на «совместима ли деталь X с моделью Y» и «все детали
+типа T для модели Y» без обращения к базе. Изменения связей меняют общую
+версию в кэше (см. signals.py), и каждый процесс перестраивает свой индекс
+при следующем обращении.
+"""
+import threading
+
+from django.core.cache import cache
+
+from .cache import _new_version
+from .models import PART_MODELS
+
+
+COMPATIBILITY_VERSION_KEY = 'catalog:compatibility:version'
+
+
+class CompatibilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        # {класс детали: {id модели автомобиля: frozenset(id деталей)}}
+        self._parts = {}
+
+    def _current_version(self):
+        version = cache.get(COMPATIBILITY_VERSION_KEY)
+        if version is None:
+            cache.add(COMPATIBILITY_VERSION_KEY, _new_version(), None)
+            version = cache.get(COMPATIBILITY_VERSION_KEY)
+        return version
+
+    def _load(self):
+        version = self._current_version()
+        if version == self._version:
+            return self._parts
+        with self._lock:
+            if version != self._version:
+                self._parts = self._build()
+                self._version = version
+        return self._parts
+
+    def _build(self):
+        parts = {}
+        for part_model in PART_MODELS:
+            field = part_model.compatible_car_models.field
+            rows = field.remote_field.through.objects.values_list(
+                field.m2m_reverse_name(), field.m2m_column_name()
+            )
+            by_car_model = {}
+            for car_model_id, part_id in rows:
+                by_car_model.setdefault(car_model_id, set()).add(part_id)
+            parts[part_model] = {
+                car_model_id: frozenset(part_ids) for car_model_id, part_ids in by_car_model.items()
+            }
+        return parts
+
+    def part_ids(self, part_model, car_model_id):
+        """id всех деталей типа part_model, совместимых с моделью автомобиля."""
+        return self._load()[part_model].get(car_model_id, frozenset())
+
+    def is_compatible(self, part, car_model_id):
+        return part.pk in self.part_ids(type(part), car_model_id)
+
+    def invalidate(self):
+        cache.set(COMPATIBILITY_VERSION_KEY, _new_version(), None)
+
+
+compatibility_index = CompatibilityIndex()
@@ -0,0 +1,203 @@
+"""
+Заранее сжатые варианты загруженных файлов каталога.
+
+Для каждого файла один раз строятся варианты <имя>.br, <имя>.zst и <имя>.gz
+и кладутся рядом с оригиналом; вариант сохраняется, только если он заметно
+меньше оригинала. Вью assets.serve_asset выбирает вариант по Accept-Encoding,
+поэтому сжатие на каждый запрос не нужно. Файлы сжимаются потоком, кусками,
+так что крупные GLB целиком в память не читаются.
+brotli и zstandard (requirements.txt) необязательны: без библиотек строятся
+только доступные варианты.
+"""
+import tempfile
+import zlib
+
+from django.core.cache import cache
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import models
+
+from .background import run_in_background
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+VARIANTS_KEY = 'asset:variants:{}'
+CHUNK_SIZE = 64 * 1024
+
+# Вариант хранится, только если он меньше этой доли оригинала
+MAX_RATIO = 0.9
+
+# Уже сжатые форматы не пережимаем
+INCOMPRESSIBLE_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif',
+    '.zip', '.gz', '.br', '.zst', '.mp4', '.webm',
+)
+
+
+# Потоковые компрессоры: compress(кусок) -> байты, flush() -> остаток
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=11)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _brotli():
+    return _BrotliCompressor()
+
+
+def _zstd():
+    return zstandard.ZstdCompressor(level=19).compressobj()
+
+
+def _gzip():
+    # wbits=31 — формат gzip; время в заголовке нулевое, результат воспроизводим
+    return zlib.compressobj(9, zlib.DEFLATED, 31)
+
+
+# (Content-Encoding, суффикс файла, фабрика компрессора) в порядке предпочтения
+ENCODINGS = [
+    (encoding, suffix, compressor)
+    for encoding, suffix, compressor, available in (
+        ('br', '.br', _brotli, brotli is not None),
+        ('zstd', '.zst', _zstd, zstandard is not None),
+        ('gzip', '.gz', _gzip, True),
+    )
+    if available
+]
+
+SUFFIXES = {encoding: suffix for encoding, suffix, compressor in ENCODINGS}
+
+
+def compress(compressor, data):
+    """Сжимает байты целиком компрессором из ENCODINGS."""
+    stream = compressor()
+    return stream.compress(data) + stream.flush()
+
+
+def is_compressible(name):
+    return not name.lower().endswith(INCOMPRESSIBLE_EXTENSIONS)
+
+
+def build_variants(name, force=False):
+    """
+    Строит сжатые варианты файла. Возвращает (размер оригинала, {encoding: размер})
+    для сохранённых вариантов. Без force уже существующие варианты не пересобираются.
+    Файл читается один раз кусками, все варианты сжимаются параллельно во временные файлы.
+    """
+    variants = {}
+    pending = []
+    for encoding, suffix, compressor in ENCODINGS:
+        variant_name = name + suffix
+        if default_storage.exists(variant_name):
+            if not force:
+                variants[encoding] = default_storage.size(variant_name)
+                continue
+            default_storage.delete(variant_name)
+        pending.append((encoding, variant_name, compressor(), tempfile.TemporaryFile()))
+
+    if not pending:
+        size = default_storage.size(name)
+    else:
+        try:
+            size = 0
+            with default_storage.open(name, 'rb') as file:
+                for chunk in file.chunks(CHUNK_SIZE):
+                    size += len(chunk)
+                    for encoding, variant_name, stream, output in pending:
+                        output.write(stream.compress(chunk))
+
+            for encoding, variant_name, stream, output in pending:
+                output.write(stream.flush())
+                compressed_size = output.tell()
+                if compressed_size < size * MAX_RATIO:
+                    output.seek(0)
+                    default_storage.save(variant_name, File(output))
+                    variants[encoding] = compressed_size
+        finally:
+            for encoding, variant_name, stream, output in pending:
+                output.close()
+
+    cache.set(VARIANTS_KEY.format(name), variants, None)
+    return size, variants
+
+
+def get_variants(name):
+    """{encoding: размер} для сохранённых вариантов файла."""
+    key = VARIANTS_KEY.format(name)
+    variants = cache.get(key)
+    if variants is None:
+        variants = {}
+        if is_compressible(name):
+            for encoding, suffix, compressor in ENCODINGS:
+                if default_storage.exists(name + suffix):
+                    variants[encoding] = default_storage.size(name + suffix)
+        cache.set(key, variants, None)
+    return variants
+
+
+def parse_accept_encoding(header):
+    """{encoding: q} из заголовка Accept-Encoding."""
+    accepted = {}
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[encoding] = q
+    return accepted
+
+
+def choose_encoding(name, accept_encoding):
+    """Лучший из сохранённых вариантов, который принимает клиент, или None."""
+    if not accept_encoding:
+        return None
+    return pick_encoding(get_variants(name), accept_encoding)
+
+
+def pick_encoding(variants, accept_encoding):
+    """Лучший из вариантов variants (encoding), который принимает клиент, или None."""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding, suffix, compressor in ENCODINGS:
+        if encoding in variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def file_names(instance):
+    """Имена файлов во всех файловых полях объекта."""
+    return [
+        getattr(instance, field.name).name
+        for field in instance._meta.fields
+        if isinstance(field, models.FileField) and getattr(instance, field.name)
+    ]
+
+
+def schedule_variants(names):
+    # Сжатие крупных GLB занимает секунды, поэтому идёт в фоне
+    for name in names:
+        if is_compressible(name):
+            run_in_background(build_variants, name, True)
@@ -0,0 +1,67 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from .cache import catalog_revision
+
+
+def _request_revision(request):
+    if not hasattr(request, '_catalog_revision'):
+        request._catalog_revision = catalog_revision()
+    return request._catalog_revision
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    ETag строится из маркера изменений каталога, а не из тела ответа:
+    тело при совпадении вообще не сериализуется. Адрес, хост и Accept
+    входят в ETag, т.к. от них зависит представление.
+    """
+    version, changed_at = _request_revision(request)
+    parts = [
+        version,
+        request.scheme,
+        request.get_host(),
+        request.get_full_path(),
+        request.headers.get('Accept', ''),
+    ]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    version, changed_at = _request_revision(request)
+    return changed_at
+
+
+# Декоратор для dispatch read-only вьюсетов каталога:
+# If-None-Match / If-Modified-Since получают 304 до запуска сериализаторов
+catalog_condition = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+
+
+def mark_stale(response):
+    """
+    Устаревший ответ (см. CarModelResponseCache) не должен получить ETag и
+    Last-Modified текущей версии каталога, иначе на него придёт 304 и после
+    сборки нового. condition() уже выставленные заголовки не перезаписывает.
+    """
+    response['ETag'] = '"stale"'
+    response['Last-Modified'] = http_date(0)
+    return response
+
+
+def async_catalog_condition(view):
+    """
+    catalog_condition для async-представлений: маркер каталога читается
+    из кэша в потоке, а не в цикле событий; ETag и Last-Modified берут его из запроса.
+    """
+    conditional_view = catalog_condition(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request._catalog_revision = await sync_to_async(catalog_revision)()
+        return await conditional_view(request, *args, **kwargs)
+
+    return wrapper
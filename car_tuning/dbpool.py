@@ -0,0 +1,33 @@
+"""
+Метрики пула соединений с базой (DB_POOL в settings.py).
+
+Пул свой в каждом процессе, поэтому метрики относятся к процессу, который
+обработал запрос. Счётчики psycopg_pool: requests_num — выдачи соединений,
+requests_wait_ms — суммарное ожидание, requests_queued — выдачи с ожиданием,
+usage_ms — суммарное время, пока соединения были выданы.
+"""
+import os
+
+from django.db import connections
+
+
+def pool_stats(reset=False):
+    """{alias: метрики} по всем базам; reset=True обнуляет счётчики."""
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            stats[alias] = {'pooled': False, 'conn_max_age': connection.settings_dict['CONN_MAX_AGE']}
+            continue
+
+        values = pool.pop_stats() if reset else pool.get_stats()
+        requests = values.get('requests_num', 0)
+        stats[alias] = {
+            'pooled': True,
+            'pid': os.getpid(),
+            **values,
+            'avg_wait_ms': values.get('requests_wait_ms', 0) / requests if requests else 0.0,
+            'avg_checkout_ms': values.get('usage_ms', 0) / requests if requests else 0.0,
+        }
+    return stats
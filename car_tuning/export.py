@@ -0,0 +1,83 @@
+from itertools import islice
+
+from django.conf import settings
+
+from .loaders import COMPATIBLE_PARTS
+from .models import CarBrand, CarModel
+from .renderers import FastJSONRenderer
+from .serializers import CarBrandSerializer, CarModelSerializer
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _compatible_model_ids(model_cls, part_ids):
+    through = model_cls.compatible_car_models.through
+    part_column = model_cls.compatible_car_models.field.m2m_column_name()
+    model_column = model_cls.compatible_car_models.field.m2m_reverse_name()
+    compatible = {pk: [] for pk in part_ids}
+    rows = (
+        through.objects
+        .filter(**{f'{part_column}__in': part_ids})
+        .order_by(part_column, model_column)
+        .values_list(part_column, model_column)
+    )
+    for part_id, car_model_id in rows:
+        compatible[part_id].append(car_model_id)
+    return compatible
+
+
+def iter_catalog(request=None, chunk_size=None):
+    """
+    Обходит весь каталог по разделам: бренды, модели и каждый тип деталей.
+    Для каждого раздела отдаёт (раздел, генератор пачек записей).
+    Строки читаются курсором на сервере через .iterator(chunk_size) и пачками
+    сериализуются быстрым путём, поэтому память не зависит от размера каталога.
+    У деталей в compatible_car_models перечислены id совместимых моделей.
+    """
+    chunk_size = chunk_size or settings.CATALOG_EXPORT_CHUNK_SIZE
+
+    sections = [
+        ('brands', CarBrandSerializer.get_fast_plan(), CarBrand.objects.with_model_count().order_by('pk'), None),
+        ('models', CarModelSerializer.get_fast_plan(detail=True), CarModel.objects.order_by('pk'), None),
+    ]
+    for key, (model_cls, serializer_cls) in COMPATIBLE_PARTS.items():
+        sections.append((key, serializer_cls.get_fast_plan(), model_cls.objects.order_by('pk'), model_cls))
+
+    for section, plan, queryset, part_model in sections:
+        yield section, _iter_batches(plan, queryset, part_model, request, chunk_size)
+
+
+def _iter_batches(plan, queryset, part_model, request, chunk_size):
+    rows = plan.values(queryset).iterator(chunk_size=chunk_size)
+    for batch in _batches(rows, chunk_size):
+        # Флаги и прочие пакетные значения загружаются на каждую пачку
+        items = plan.serialize(batch, {'request': request})
+        if part_model is not None:
+            compatible = _compatible_model_ids(part_model, [item['id'] for item in items])
+            for item in items:
+                item['compatible_car_models'] = compatible[item['id']]
+        yield items
+
+
+def stream_ndjson(request=None, chunk_size=None):
+    """NDJSON: по строке {"type": раздел, "data": запись} на запись, по куску на пачку."""
+    render = FastJSONRenderer().render
+    for section, batches in iter_catalog(request, chunk_size):
+        for items in batches:
+            yield b''.join(render({'type': section, 'data': item}) + b'\n' for item in items)
+
+
+def stream_json(request=None, chunk_size=None):
+    """Один JSON-объект {"brands": [...], "models": [...], "spoilers": [...], ...}, по куску на пачку."""
+    render = FastJSONRenderer().render
+    yield b'{'
+    for index, (section, batches) in enumerate(iter_catalog(request, chunk_size)):
+        yield (b',' if index else b'') + render(section) + b':['
+        for batch_index, items in enumerate(batches):
+            yield (b',' if batch_index else b'') + b','.join(render(item) for item in items)
+        yield b']'
+    yield b'}'
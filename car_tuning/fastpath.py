@@ -0,0 +1,228 @@
+"""
+Быстрый путь сериализации каталога только для чтения.
+
+План полей строится один раз на класс сериализатора: для каждого поля
+запоминается колонка для .values() и функция представления. Строки читаются
+словарями из .values() без создания моделей и сериализаторов на каждый объект,
+а значения проходят через to_representation тех же полей, поэтому результат
+совпадает с обычной сериализацией.
+
+Поддерживаются обычные поля модели (в т.ч. через source='fk.field'),
+вложенные FastSerializerMixin-сериализаторы и SerializerMethodField,
+у которых есть пакетный classmethod resolve_<имя поля>(pks, context).
+Файловые поля с методом prefetch(names, context) получают имена файлов всех
+строк разом, до представления (например, чтобы прочитать кэш одним запросом).
+Если в сериализаторе встречается что-то другое, план не строится (None)
+и вьюсет идёт обычным путём.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+class ColumnEntry:
+    def __init__(self, name, column, to_representation):
+        self.name = name
+        self.column = column
+        self.to_representation = to_representation
+
+    def represent(self, row, batches, context):
+        value = row[self.column]
+        if value is None:
+            return None
+        return self.to_representation(value)
+
+
+class FileEntry:
+    def __init__(self, name, column, field, model_field):
+        self.name = name
+        self.column = column
+        self.field = field
+        self.model_field = model_field
+
+    def represent(self, row, batches, context):
+        value = row[self.column]
+        if value is None:
+            return None
+        return self.field.fast_representation(FieldFile(None, self.model_field, value), context)
+
+
+class MethodEntry:
+    def __init__(self, name, resolver, pk_column):
+        self.name = name
+        self.resolver = resolver
+        self.pk_column = pk_column
+
+    def represent(self, row, batches, context):
+        values = batches.get(self)
+        if values is None:
+            # Значение пришло аннотацией запроса
+            return row[self.name]
+        return values[row[self.pk_column]]
+
+
+class NestedEntry:
+    def __init__(self, name, plan):
+        self.name = name
+        self.plan = plan
+
+    def represent(self, row, batches, context):
+        if row[self.plan.pk_column] is None:
+            return None
+        return self.plan.represent(row, batches, context)
+
+
+def _model_field(model, source_attrs):
+    """Поле модели по цепочке source, либо None, если это не колонка."""
+    try:
+        for attr in source_attrs[:-1]:
+            model = model._meta.get_field(attr).related_model
+            if model is None:
+                return None
+        field = model._meta.get_field(source_attrs[-1])
+    except FieldDoesNotExist:
+        return None
+    if field.is_relation:
+        return None
+    return field
+
+
+class FieldPlan:
+    def __init__(self, model, prefix, entries):
+        self.model = model
+        self.prefix = prefix
+        self.pk_column = prefix + model._meta.pk.attname
+        self.entries = entries
+
+    @classmethod
+    def build(cls, serializer, prefix=''):
+        model = serializer.Meta.model
+        entries = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                resolver = getattr(type(serializer), f'resolve_{field.field_name}', None)
+                if resolver is None:
+                    return None
+                entries.append(MethodEntry(field.field_name, resolver, prefix + model._meta.pk.attname))
+            elif isinstance(field, serializers.BaseSerializer):
+                if not isinstance(field, FastSerializerMixin) or len(field.source_attrs) != 1:
+                    return None
+                nested = cls.build(field, prefix=f'{prefix}{field.source}__')
+                if nested is None:
+                    return None
+                entries.append(NestedEntry(field.field_name, nested))
+            else:
+                if field.source == '*':
+                    return None
+                model_field = _model_field(model, field.source_attrs)
+                if model_field is None:
+                    return None
+                column = prefix + '__'.join(field.source_attrs)
+                if isinstance(field, serializers.FileField):
+                    if not hasattr(field, 'fast_representation'):
+                        return None
+                    entries.append(FileEntry(field.field_name, column, field, model_field))
+                else:
+                    entries.append(ColumnEntry(field.field_name, column, field.to_representation))
+        return cls(model, prefix, entries)
+
+    def columns(self):
+        columns = [self.pk_column]
+        for entry in self.entries:
+            if isinstance(entry, NestedEntry):
+                columns.extend(entry.plan.columns())
+            elif not isinstance(entry, MethodEntry):
+                columns.append(entry.column)
+        return columns
+
+    def values(self, queryset, extra=()):
+        """
+        .values() с колонками плана. extra — дополнительные колонки
+        (например поля сортировки для курсорной пагинации).
+        Методы-поля верхнего уровня, для которых в запросе есть
+        одноимённая аннотация, берут значение из неё.
+        """
+        columns = self.columns()
+        annotations = [
+            entry.name for entry in self.entries
+            if isinstance(entry, MethodEntry) and entry.name in queryset.query.annotations
+        ]
+        for column in [*annotations, *(name.lstrip('-') for name in extra)]:
+            if column not in columns:
+                columns.append(column)
+        return queryset.prefetch_related(None).values(*columns)
+
+    def _annotated(self, entry, rows):
+        return not self.prefix and bool(rows) and entry.name in rows[0]
+
+    def _resolve_batches(self, rows, context, batches):
+        for entry in self.entries:
+            if isinstance(entry, NestedEntry):
+                entry.plan._resolve_batches(rows, context, batches)
+            elif isinstance(entry, MethodEntry) and not self._annotated(entry, rows):
+                pks = {row[entry.pk_column] for row in rows if row[entry.pk_column] is not None}
+                batches[entry] = entry.resolver(pks, context) if pks else {}
+            elif isinstance(entry, FileEntry) and hasattr(entry.field, 'prefetch'):
+                names = {row[entry.column] for row in rows if row[entry.column]}
+                if names:
+                    entry.field.prefetch(names, context)
+        return batches
+
+    def represent(self, row, batches, context):
+        return {entry.name: entry.represent(row, batches, context) for entry in self.entries}
+
+    def serialize(self, rows, context=None):
+        if context is None:
+            context = {}
+        rows = list(rows)
+        batches = self._resolve_batches(rows, context, {})
+        return [self.represent(row, batches, context) for row in rows]
+
+
+class CatalogFileField(serializers.FileField):
+    """FileField, который умеет представлять значение с явно переданным контекстом."""
+
+    def to_representation(self, value):
+        return self.fast_representation(value, self.context)
+
+    def fast_representation(self, value, context):
+        if not value:
+            return None
+
+        if getattr(self, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            try:
+                url = value.url
+            except AttributeError:
+                return None
+            request = context.get('request', None)
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+
+        return value.name
+
+
+class FastSerializerMixin:
+    """
+    Подключает сериализатор к быстрому пути (см. модуль выше).
+    Файловые поля модели получают CatalogFileField с fast_representation.
+    """
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.FileField: CatalogFileField,
+    }
+
+    @classmethod
+    def get_fast_plan(cls, **kwargs):
+        """План полей для сериализатора, созданного с kwargs; строится один раз."""
+        key = (cls, tuple(sorted(kwargs.items())))
+        if key not in _plans:
+            _plans[key] = FieldPlan.build(cls(**kwargs))
+        return _plans[key]
+
+
+_plans = {}
@@ -0,0 +1,95 @@
+"""
+Выборочные поля ответов каталога: ?fields= и ?expand=.
+
+    ?fields=id,name,preview_image  — только эти ключи верхнего уровня
+    ?expand=spoilers,discs         — добавить эти группы совместимых деталей
+
+Без параметров ответ полный, как раньше. У модели автомобиля группы
+деталей можно перечислить и в fields; если fields задан, а групп в нём и в
+expand нет, совместимые детали не загружаются вовсе. id выводится всегда.
+Невыбранные поля не строятся в сериализаторе, поэтому их колонки, JOIN и
+пакетные запросы (бренд с количеством моделей, флаги «Скоро») не выполняются.
+Неизвестное имя — ошибка 400.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+def parse_names(request, param):
+    """Имена из ?param=a,b или None, если параметра нет."""
+    value = request.GET.get(param)
+    if value is None:
+        return None
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+def select(names, allowed, param):
+    """Имена из allowed в их порядке; неизвестные имена — ошибка 400."""
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError({param: [f'Неизвестное поле: {name}' for name in unknown]})
+    return tuple(name for name in allowed if name in names)
+
+
+class FieldSelection:
+    """
+    Выбор клиента: fields — поля сериализатора (None — все),
+    groups — группы совместимых деталей (или другие дозагружаемые ключи ответа).
+    """
+
+    def __init__(self, fields, groups, default):
+        self.fields = fields
+        self.groups = groups
+        self.default = default
+
+    @classmethod
+    def from_request(cls, request, field_names, group_names=()):
+        fields = parse_names(request, 'fields')
+        expand = parse_names(request, 'expand')
+
+        if fields is None:
+            selected = None
+            groups = group_names if expand is None else ()
+        else:
+            chosen = select(fields, (*field_names, *group_names), 'fields')
+            selected = tuple(name for name in field_names if name in chosen or name == 'id')
+            groups = tuple(name for name in group_names if name in chosen)
+        if expand is not None:
+            expanded = select(expand, group_names, 'expand')
+            groups = tuple(name for name in group_names if name in groups or name in expanded)
+
+        return cls(selected, groups, default=fields is None and expand is None)
+
+    def cache_kind(self, kind):
+        """Вид ответа для кэша (см. CarModelResponseCache) с учётом выбора."""
+        if self.default:
+            return kind
+        fields = '*' if self.fields is None else ','.join(self.fields)
+        return f"{kind}:{fields}:{','.join(self.groups)}"
+
+
+class SparseFieldsMixin:
+    """
+    Необязательный аргумент сериализатора fields — какие поля строить
+    (см. FieldSelection); остальные отбрасываются до построения полей.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.only_fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+    def get_field_names(self, declared_fields, info):
+        field_names = super().get_field_names(declared_fields, info)
+        if self.only_fields is None:
+            return field_names
+        return [name for name in field_names if name in self.only_fields]
+
+    @classmethod
+    def get_field_names_for(cls, **kwargs):
+        """Имена всех полей сериализатора, созданного с kwargs; вычисляются один раз."""
+        key = (cls, tuple(sorted(kwargs.items())))
+        if key not in _field_names:
+            _field_names[key] = tuple(cls(**kwargs).fields)
+        return _field_names[key]
+
+
+_field_names = {}
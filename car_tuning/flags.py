@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from .models import ComingSoon
+
+
+def flag_key(obj):
+    return obj._meta.model, obj.pk
+
+
+def load_coming_soon(pks_by_model):
+    """
+    Загружает флаги «Скоро» одним запросом по {класс модели: pk объектов}.
+    Возвращает {(класс модели, pk): coming_soon} для каждого переданного объекта.
+    """
+    pks_by_model = {model_cls: set(pks) for model_cls, pks in pks_by_model.items() if pks}
+    if not pks_by_model:
+        return {}
+
+    flags = {
+        (model_cls, pk): False
+        for model_cls, pks in pks_by_model.items()
+        for pk in pks
+    }
+
+    content_types = ContentType.objects.get_for_models(*pks_by_model)
+    models_by_ct = {ct.pk: model_cls for model_cls, ct in content_types.items()}
+
+    condition = Q()
+    for model_cls, pks in pks_by_model.items():
+        condition |= Q(content_type=content_types[model_cls], object_id__in=pks)
+
+    rows = ComingSoon.objects.filter(condition).values_list('content_type_id', 'object_id', 'coming_soon')
+    for content_type_id, object_id, coming_soon in rows:
+        flags[models_by_ct[content_type_id], object_id] = coming_soon
+    return flags
+
+
+def resolve_coming_soon(objects):
+    """
+    Флаги для набора объектов любых моделей с флагом (детали, CarModel) вперемешку.
+    """
+    pks_by_model = defaultdict(set)
+    for obj in objects:
+        pks_by_model[obj._meta.model].add(obj.pk)
+    return load_coming_soon(pks_by_model)
+
+
+def get_coming_soon(obj, flags=None):
+    """
+    Значение флага для объекта из заранее загруженной карты.
+    Если объекта в карте нет, флаг загружается отдельным запросом и кладётся в карту.
+    """
+    if flags is None:
+        flags = {}
+    key = flag_key(obj)
+    if key not in flags:
+        flags.update(resolve_coming_soon([obj]))
+    return flags[key]
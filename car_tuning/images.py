@@ -0,0 +1,233 @@
+"""
+Уменьшенные копии изображений каталога: превью бренда, модели и детали.
+
+Для каждого изображения строятся размеры thumb/card/full в WebP и JPEG
+и сохраняются в derivatives/<имя без расширения>/<размер>.<формат>.
+Карта копий вместе с хэшами их содержимого хранится в кэше, поэтому адреса
+/api/assets/<digest>/... (Cache-Control: immutable) строятся без обращений
+к хранилищу. На запросе карты читаются одним cache.get_many для всех строк;
+если карты в кэше нет, она строится в фоне, а до тех пор поле — null.
+Когда карта готова, ответы с этим изображением сбрасываются (см. build_and_cache),
+иначе null остался бы в кэше ответов и за ETag до следующей правки каталога.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .assets import DIGEST_LENGTH, asset_url, file_digest
+from .background import run_in_background
+from .cache import car_model_cache
+from .fastpath import CatalogFileField
+from .models import CarModel, PART_MODELS
+
+
+DERIVATIVES_KEY = 'image:derivatives:{}'
+# Пока копий нет, повторная постановка сборки в фон не чаще этого интервала
+MISSING_TIMEOUT = 300
+CONTEXT_KEY = 'image_derivatives'
+DERIVATIVES_DIR = 'derivatives'
+
+# Наибольшая сторона для каждого размера, px
+SIZES = {
+    'thumb': 96,
+    'card': 480,
+    'full': 1600,
+}
+
+# формат: (расширение, параметры сохранения)
+FORMATS = {
+    'webp': ('.webp', {'format': 'WEBP', 'quality': 80, 'method': 6}),
+    'jpeg': ('.jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def derivative_name(name, size, image_format):
+    base, _ = os.path.splitext(name)
+    return f'{DERIVATIVES_DIR}/{base}/{size}{FORMATS[image_format][0]}'
+
+
+def _encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        # У JPEG нет прозрачности — кладём на белый фон
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, **FORMATS[image_format][1])
+    return buffer.getvalue()
+
+
+def build_derivatives(name, force=False):
+    """
+    Строит копии изображения и возвращает карту
+    {размер: {'width': px, формат: имя, 'digests': {формат: хэш содержимого}}}.
+    Для файлов, которые Pillow не читает (например SVG), карта пустая.
+    """
+    try:
+        with default_storage.open(name, 'rb') as file:
+            original = Image.open(file)
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        return {}
+
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        has_alpha = original.mode in ('LA', 'PA') or 'transparency' in original.info
+        original = original.convert('RGBA' if has_alpha else 'RGB')
+
+    derivatives = {}
+    for size, max_side in SIZES.items():
+        image = original.copy()
+        # Не увеличиваем: маленький оригинал просто перекодируется
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        entry = {'width': image.width, 'digests': {}}
+        for image_format in FORMATS:
+            target = derivative_name(name, size, image_format)
+            if default_storage.exists(target):
+                if not force:
+                    entry[image_format] = target
+                    entry['digests'][image_format] = file_digest(target)
+                    continue
+                default_storage.delete(target)
+            data = _encode(image, image_format)
+            entry[image_format] = default_storage.save(target, ContentFile(data))
+            entry['digests'][image_format] = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        derivatives[size] = entry
+    return derivatives
+
+
+def cache_derivatives(name, derivatives):
+    cache.set(DERIVATIVES_KEY.format(name), derivatives, None if derivatives else MISSING_TIMEOUT)
+
+
+def owner_car_model_ids(name):
+    """id моделей автомобилей, в ответах которых есть копии изображения: превью, логотип бренда, картинка детали."""
+    car_model_ids = set(
+        CarModel.objects.filter(Q(preview_image=name) | Q(brand__logo=name)).values_list('pk', flat=True)
+    )
+    for part_model in PART_MODELS:
+        car_model_ids.update(
+            part_model.objects
+            .filter(image=name, compatible_car_models__isnull=False)
+            .values_list('compatible_car_models', flat=True)
+        )
+    return car_model_ids
+
+
+def build_and_cache(name, force=False):
+    derivatives = build_derivatives(name, force)
+    cache_derivatives(name, derivatives)
+    if derivatives:
+        # В закэшированных ответах и ETag набор копий ещё null — сбрасываем их
+        # (invalidate меняет и маркер каталога для списков и снимков)
+        car_model_cache.invalidate(owner_car_model_ids(name))
+    return derivatives
+
+
+def load_derivatives(names):
+    """
+    {имя: карта копий} одним cache.get_many. Если карты в кэше нет, она строится
+    в фоне (уже готовые файлы копий не пересобираются), а пока — пустая.
+    """
+    keys = {DERIVATIVES_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    derivatives = {}
+    for key, name in keys.items():
+        if key in found:
+            derivatives[name] = found[key]
+            continue
+        derivatives[name] = {}
+        # Отметка «нет копий» не даёт ставить одну и ту же сборку на каждый запрос
+        # и не затирает карту, если её успела записать другая сборка
+        if is_image(name) and cache.add(key, {}, MISSING_TIMEOUT):
+            run_in_background(build_and_cache, name)
+    return derivatives
+
+
+def missing_derivatives(names):
+    """Изображения из names, для которых в кэше нет готовой карты копий."""
+    keys = {DERIVATIVES_KEY.format(name): name for name in names if is_image(name)}
+    found = cache.get_many(keys)
+    return [name for key, name in keys.items() if not found.get(key)]
+
+
+def get_derivatives(name):
+    """Карта копий изображения; пока копии не построены — пустая."""
+    return load_derivatives([name])[name]
+
+
+def thumbnail_url(name):
+    """Адрес thumb-копии в WebP или None, если её ещё нет."""
+    entry = get_derivatives(name).get('thumb')
+    if entry is None:
+        return None
+    return asset_url(entry['webp'], entry.get('digests', {}).get('webp'))
+
+
+def schedule_derivatives(names):
+    for name in names:
+        if is_image(name):
+            run_in_background(build_and_cache, name, True)
+
+
+class ImageSetField(CatalogFileField):
+    """
+    Набор уменьшенных копий изображения в виде, удобном для srcset:
+    {"thumb": {"width": 96, "webp": url, "jpeg": url}, "card": {...}, "full": {...},
+     "srcset": {"webp": "url 96w, url 480w, ...", "jpeg": "..."}}.
+    Пока копии не построены — null.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def prefetch(names, context):
+        """Читает карты копий для всех строк ответа разом (см. fastpath)."""
+        loaded = context.setdefault(CONTEXT_KEY, {})
+        missing = [name for name in names if name not in loaded]
+        if missing:
+            loaded.update(load_derivatives(missing))
+
+    def fast_representation(self, value, context):
+        if not value:
+            return None
+        loaded = context.get(CONTEXT_KEY, {})
+        derivatives = loaded[value.name] if value.name in loaded else get_derivatives(value.name)
+        if not derivatives:
+            return None
+
+        request = context.get('request', None)
+        representation = {}
+        srcset = {image_format: {} for image_format in FORMATS}
+        for size, entry in derivatives.items():
+            item = {'width': entry['width']}
+            for image_format in FORMATS:
+                # Карты, собранные до появления хэшей, дочитывают хэш из файла
+                digest = entry.get('digests', {}).get(image_format)
+                url = asset_url(entry[image_format], digest) or default_storage.url(entry[image_format])
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                item[image_format] = url
+                # У маленького оригинала размеры совпадают — в srcset по одному на ширину
+                srcset[image_format].setdefault(entry['width'], url)
+            representation[size] = item
+        representation['srcset'] = {
+            image_format: ', '.join(f'{url} {width}w' for width, url in urls.items())
+            for image_format, urls in srcset.items()
+        }
+        return representation
@@ -0,0 +1,89 @@
+from django.db.models import F
+
+from .flags import load_coming_soon
+from .models import (
+    Spoiler, Discs, Restyling, Bumper,
+    RearBumper, SideSkirt, Tinting, Color
+)
+from .serializers import (
+    SpoilerSerializer, DiscsSerializer, RestylingSerializer, BumperSerializer,
+    RearBumperSerializer, SideSkirtSerializer, TintingSerializer, ColorSerializer
+)
+
+
+COMPATIBLE_PARTS = {
+    'spoilers': (Spoiler, SpoilerSerializer),
+    'discs': (Discs, DiscsSerializer),
+    'restylings': (Restyling, RestylingSerializer),
+    'bumpers': (Bumper, BumperSerializer),
+    'rear_bumpers': (RearBumper, RearBumperSerializer),
+    'side_skirts': (SideSkirt, SideSkirtSerializer),
+    'tintings': (Tinting, TintingSerializer),
+}
+
+
+def compatible_part_querysets(car_model_ids, keys=None):
+    """
+    {ключ: запрос строк .values()} по каждой таблице деталей (или только
+    по ключам keys); строка содержит compatible_car_model_id — для какой
+    модели она выбрана.
+    """
+    querysets = {}
+    for key, (model_cls, serializer_cls) in COMPATIBLE_PARTS.items():
+        if keys is not None and key not in keys:
+            continue
+        queryset = (
+            model_cls.objects
+            .filter(compatible_car_models__in=car_model_ids)
+            .annotate(compatible_car_model_id=F('compatible_car_models'))
+            .order_by('order', 'name')
+        )
+        querysets[key] = serializer_cls.get_fast_plan().values(queryset, extra=['compatible_car_model_id'])
+    return querysets
+
+
+def compatible_part_flags(rows):
+    return load_coming_soon({
+        COMPATIBLE_PARTS[key][0]: {row['id'] for row in key_rows}
+        for key, key_rows in rows.items()
+    })
+
+
+def group_compatible_parts(car_model_ids, rows, flags):
+    """Раскладывает строки деталей по моделям: {car_model_id: {'spoilers': [...], ...}}."""
+    result = {pk: {key: [] for key in rows} for pk in car_model_ids}
+    context = {'coming_soon_flags': flags}
+
+    for key in rows:
+        serializer_cls = COMPATIBLE_PARTS[key][1]
+        # Одна и та же деталь приходит отдельной строкой для каждой модели,
+        # поэтому сериализуем каждую деталь только один раз
+        unique_rows = {row['id']: row for row in rows[key]}
+        serialized = serializer_cls.get_fast_plan().serialize(unique_rows.values(), context)
+        data_by_pk = {item['id']: item for item in serialized}
+        for row in rows[key]:
+            result[row['compatible_car_model_id']][key].append(data_by_pk[row['id']])
+
+    return result
+
+
+def load_compatible_parts(car_model_ids, keys=None):
+    """
+    Загружает совместимые детали сразу для нескольких моделей автомобилей:
+    по одному запросу на каждую таблицу деталей и один запрос на флаги.
+    Результат раскладывается по моделям в памяти:
+    {car_model_id: {'spoilers': [...], 'discs': [...], ...}}.
+    keys ограничивает таблицы деталей (см. fieldsets.py).
+    """
+    car_model_ids = list(car_model_ids)
+    if not car_model_ids:
+        return {}
+
+    querysets = compatible_part_querysets(car_model_ids, keys)
+    rows = {key: list(queryset) for key, queryset in querysets.items()}
+    return group_compatible_parts(car_model_ids, rows, compatible_part_flags(rows))
+
+
+def load_colors():
+    colors = Color.objects.all().order_by('order')
+    return ColorSerializer.get_fast_plan().serialize(ColorSerializer.get_fast_plan().values(colors))
@@ -0,0 +1,140 @@
+import random
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from car_tuning.models import (
+    ComingSoon, CarBrand, CarModel, UserCarCustomization, PART_MODELS, Spoiler
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+def compatibility_index_name(part_model):
+    # Индексы промежуточных таблиц из миграции 0006_query_indexes
+    return f'{part_model._meta.model_name}_compat_car_idx'
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу объёмом данных, близким к рабочему, и печатает "
+        "EXPLAIN ANALYZE горячих запросов с индексами из 0006_query_indexes "
+        "(и уникальным ограничением флагов «Скоро» из 0004) и без них. "
+        "Всё выполняется в транзакции и откатывается, но удаление индексов блокирует "
+        "таблицы — не запускайте на рабочей базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brands', type=int, default=40)
+        parser.add_argument('--models-per-brand', type=int, default=25)
+        parser.add_argument('--parts', type=int, default=300, help="Деталей каждого типа")
+        parser.add_argument('--compatible', type=int, default=40, help="Совместимых моделей на деталь")
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--customizations', type=int, default=25, help="Кастомизаций на пользователя")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.analyze()
+                with_indexes = self.explain_all()
+                self.drop_indexes()
+                without_indexes = self.explain_all()
+                for label, plan in without_indexes.items():
+                    self.stdout.write(self.style.MIGRATE_HEADING(label))
+                    self.stdout.write("-- без индексов")
+                    self.stdout.write(plan)
+                    self.stdout.write("-- с индексами")
+                    self.stdout.write(with_indexes[label])
+                    self.stdout.write('')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        brands = CarBrand.objects.bulk_create(
+            CarBrand(name=f'Brand {i}', logo='brands/logos/brand.png') for i in range(options['brands'])
+        )
+        car_models = CarModel.objects.bulk_create(
+            CarModel(brand=brand, name=f'Model {i}')
+            for brand in brands for i in range(options['models_per_brand'])
+        )
+        self.car_model = random.choice(car_models)
+
+        flags = [ComingSoon(content_object=car_model, coming_soon=False) for car_model in car_models]
+        for part_model in PART_MODELS:
+            parts = part_model.objects.bulk_create(
+                part_model(name=f'{part_model.__name__} {i}', model_3d='parts/3d_models/part.glb', order=i % 10)
+                for i in range(options['parts'])
+            )
+            field = part_model.compatible_car_models.field
+            through = field.remote_field.through
+            through.objects.bulk_create(
+                through(**{field.m2m_field_name() + '_id': part.pk, field.m2m_reverse_field_name() + '_id': car_model.pk})
+                for part in parts
+                for car_model in random.sample(car_models, min(options['compatible'], len(car_models)))
+            )
+            flags.extend(ComingSoon(content_object=part, coming_soon=False) for part in parts)
+        ComingSoon.objects.bulk_create(flags, batch_size=1000)
+
+        users = User.objects.bulk_create(User(username=f'benchmark-{i}') for i in range(options['users']))
+        self.user = random.choice(users)
+        UserCarCustomization.objects.bulk_create(
+            (
+                UserCarCustomization(user=user, car_model=random.choice(car_models))
+                for user in users for _ in range(options['customizations'])
+            ),
+            batch_size=1000,
+        )
+
+    def analyze(self):
+        # Без свежей статистики планировщик не знает объёма таблиц
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def queries(self):
+        part_field = Spoiler.compatible_car_models.field
+        through = part_field.remote_field.through
+        return {
+            "Кастомизации пользователя": (
+                UserCarCustomization.objects.filter(user=self.user).order_by('-updated_at', '-id')[:20]
+            ),
+            "Страница деталей": Spoiler.objects.order_by('order', 'name', 'id')[:50],
+            "Детали модели автомобиля": (
+                Spoiler.objects.filter(compatible_car_models=self.car_model).order_by('order', 'name')
+            ),
+            "Связи модели автомобиля": (
+                through.objects.filter(**{part_field.m2m_reverse_field_name(): self.car_model})
+                .values_list(part_field.m2m_field_name(), flat=True)
+            ),
+            "Флаги «Скоро» объектов": ComingSoon.objects.filter(
+                content_type=ContentType.objects.get_for_model(Spoiler),
+                object_id__in=list(Spoiler.objects.values_list('pk', flat=True)[:50]),
+            ),
+        }
+
+    def explain_all(self):
+        options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+        return {label: queryset.explain(**options) for label, queryset in self.queries().items()}
+
+    def drop_indexes(self):
+        names = [index.name for model_cls in (*PART_MODELS, UserCarCustomization) for index in model_cls._meta.indexes]
+        names += [compatibility_index_name(part_model) for part_model in PART_MODELS]
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f'DROP INDEX {quote_name(name)}')
+            # Флаги «Скоро» читаются по индексу уникального ограничения (content_type, object_id),
+            # без него сравнение флагов показало бы тот же план. Вернёт его откат транзакции.
+            # Без поддержки INCLUDE (SQLite) ограничение не создаётся вовсе
+            if connection.features.supports_covering_indexes:
+                for constraint in ComingSoon._meta.constraints:
+                    cursor.execute(
+                        f'ALTER TABLE {quote_name(ComingSoon._meta.db_table)} DROP CONSTRAINT {quote_name(constraint.name)}'
+                    )
+        self.analyze()
@@ -0,0 +1,104 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from car_tuning.cache import catalog_revision
+from car_tuning.compression import file_names
+from car_tuning.images import build_and_cache, missing_derivatives
+from car_tuning.models import CarModel
+from car_tuning.signals import MEDIA_MODELS
+from car_tuning.snapshots import (
+    MODELS_PATH, STATIC_FILES, activate, build_compatible_parts, build_models_pages,
+    remove_old, render, request_factory, write_file, write_manifest
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает статический снимок каталога (бренды, модели, compatible_parts "
+        "каждой модели, цвета) со сжатыми вариантами и переключает на него current"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default=settings.CATALOG_SNAPSHOT_BASE_URL,
+            help="Схема и хост, для которых строятся абсолютные URL, например https://example.com/ "
+                 "(по умолчанию CATALOG_SNAPSHOT_BASE_URL)"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Количество процессов (по умолчанию по числу ядер)"
+        )
+        parser.add_argument('--keep', type=int, default=2, help="Сколько прошлых снимков оставить")
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        if not base_url:
+            raise CommandError("Укажите --base-url или CATALOG_SNAPSHOT_BASE_URL")
+        base_url = base_url.rstrip('/') + '/'
+
+        # Копии изображений строятся до снимка: иначе в нём будет null вместо
+        # набора копий, а их фоновая сборка сменит версию каталога посреди снимка
+        for name in sorted(missing_derivatives(self.image_names())):
+            build_and_cache(name)
+
+        root = settings.CATALOG_SNAPSHOT_ROOT
+        revision = catalog_revision()[0]
+        version = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        directory = os.path.join(root, version)
+        os.makedirs(directory)
+        try:
+            files, pages = self.build(directory, base_url, options['workers'])
+            if catalog_revision()[0] != revision:
+                raise CommandError(f"Каталог изменился во время сборки, снимок {version} не включён")
+        except BaseException:
+            shutil.rmtree(directory)
+            raise
+
+        write_manifest(directory, {
+            'version': version,
+            'revision': revision,
+            'base_url': base_url,
+            'files': files,
+            'pages': pages,
+        })
+        activate(root, version)
+        self.stdout.write(f"Снимок {version}: {len(files)} файлов")
+
+        for removed in remove_old(root, options['keep']):
+            self.stdout.write(f"Удалён снимок {removed}")
+
+    def image_names(self):
+        names = set()
+        for model_cls in MEDIA_MODELS:
+            for instance in model_cls.objects.all():
+                names.update(file_names(instance))
+        return names
+
+    def build(self, directory, base_url, workers):
+        """
+        Пишет файлы снимка. Возвращает ({имя файла: [encoding сжатых вариантов]},
+        {курсор страницы /api/models/: имя файла}).
+        """
+        factory = request_factory(base_url)
+        files, pages = build_models_pages(directory, factory)
+        for path, name in STATIC_FILES.items():
+            if path != MODELS_PATH:
+                files[name] = write_file(directory, name, render(factory, path))
+
+        car_model_ids = list(CarModel.objects.order_by('pk').values_list('pk', flat=True))
+        workers = max(workers, 1)
+        batches = [car_model_ids[i::workers] for i in range(workers) if car_model_ids[i::workers]]
+        # Дочерние процессы не должны унаследовать открытые соединения родителя
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            futures = [executor.submit(build_compatible_parts, directory, base_url, batch) for batch in batches]
+            for future in as_completed(futures):
+                files.update(future.result())
+        return files, pages
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from car_tuning.compression import build_variants, file_names, is_compressible
+from car_tuning.signals import MEDIA_MODELS
+
+
+class Command(BaseCommand):
+    help = "Строит сжатые варианты (br/zstd/gzip) для уже загруженных файлов каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Пересобрать существующие варианты")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model_cls in MEDIA_MODELS:
+            for instance in model_cls.objects.all():
+                names.update(name for name in file_names(instance) if is_compressible(name))
+
+        total_original = 0
+        total_best = 0
+        for name in sorted(names):
+            try:
+                size, variants = build_variants(name, force=options['force'])
+            except OSError as error:
+                self.stderr.write(f"{name}: {error}")
+                continue
+
+            best = min(variants.values(), default=size)
+            total_original += size
+            total_best += best
+            details = ', '.join(
+                f"{encoding} {variant_size} ({variant_size / size:.1%})"
+                for encoding, variant_size in variants.items()
+            ) or "не сжимается"
+            self.stdout.write(f"{name}: {size} -> {details}")
+
+        if total_original:
+            self.stdout.write(
+                f"Файлов: {len(names)}, {total_original} -> {total_best} байт "
+                f"({total_best / total_original:.1%})"
+            )
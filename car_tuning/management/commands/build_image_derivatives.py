@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from car_tuning.cache import car_model_cache
+from car_tuning.compression import file_names
+from car_tuning.images import build_derivatives, cache_derivatives, is_image
+from car_tuning.signals import MEDIA_MODELS
+
+
+class Command(BaseCommand):
+    help = "Строит уменьшенные копии (thumb/card/full, WebP/JPEG) изображений каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Пересобрать существующие копии")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Количество процессов (по умолчанию по числу ядер)"
+        )
+
+    def handle(self, *args, **options):
+        names = set()
+        for model_cls in MEDIA_MODELS:
+            for instance in model_cls.objects.all():
+                names.update(name for name in file_names(instance) if is_image(name))
+
+        built = 0
+        # Процессы только читают и пишут файлы; кэш заполняется здесь,
+        # т.к. локальный кэш дочернего процесса пропадёт вместе с ним
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = {
+                executor.submit(build_derivatives, name, options['force']): name
+                for name in sorted(names)
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    derivatives = future.result()
+                except Exception as error:
+                    self.stderr.write(f"{name}: {error}")
+                    continue
+                cache_derivatives(name, derivatives)
+                if derivatives:
+                    built += 1
+                    widths = ', '.join(f"{size} {entry['width']}px" for size, entry in derivatives.items())
+                    self.stdout.write(f"{name}: {widths}")
+                else:
+                    self.stdout.write(f"{name}: не изображение, пропущено")
+
+        if built:
+            # Ответы, собранные до появления копий, содержат null вместо набора
+            car_model_cache.invalidate_all()
+        self.stdout.write(f"Готово: {built} из {len(names)}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from car_tuning.cache import car_model_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Статистика попаданий в кэш ответов каталога. Воркеры сбрасывают счётчики "
+        "в общий кэш раз в STATS_FLUSH_INTERVAL секунд, поэтому последние запросы могут не войти"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Сбросить счётчики после вывода")
+
+    def handle(self, *args, **options):
+        stats = car_model_cache.stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}\n"
+            f"misses: {stats['misses']}\n"
+            f"stale: {stats['stale']}\n"
+            f"hit ratio: {stats['hit_ratio']:.2%}"
+        )
+        if options['reset']:
+            car_model_cache.reset_stats()
+            self.stdout.write("Счётчики сброшены")
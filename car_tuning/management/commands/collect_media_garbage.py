@@ -0,0 +1,85 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from car_tuning.images import DERIVATIVES_DIR
+from car_tuning.signals import MEDIA_MODELS, file_field_names
+from car_tuning.storage import BLOBS_DIR
+
+
+# Суффиксы сжатых вариантов (см. compression.py), включая те,
+# для которых сейчас нет библиотеки
+VARIANT_SUFFIXES = ('.br', '.zst', '.gz')
+
+
+def walk(directory):
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет файлы каталога, на которые не ссылается ни один объект: blob, "
+        "старые файлы в каталогах upload_to, их сжатые варианты и уменьшенные копии"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет удалено")
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help="Не трогать файлы моложе стольких минут: объект с только что "
+                 "загруженным файлом мог ещё не сохраниться (по умолчанию 60)"
+        )
+
+    def handle(self, *args, **options):
+        references = Counter()
+        directories = {BLOBS_DIR, DERIVATIVES_DIR}
+        for model_cls in MEDIA_MODELS:
+            for field_name in file_field_names(model_cls):
+                directories.add(model_cls._meta.get_field(field_name).upload_to.rstrip('/'))
+                references.update(
+                    name for name in model_cls.objects.values_list(field_name, flat=True) if name
+                )
+        referenced_bases = {os.path.splitext(name)[0] for name in references}
+
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(f"Файлов в ссылках: {len(references)}, из них общих для нескольких объектов: {shared}")
+
+        cutoff = timezone.now() - timedelta(minutes=options['grace'])
+        removed = 0
+        freed = 0
+        for directory in sorted(directories):
+            for name in walk(directory):
+                if self.is_referenced(name, references, referenced_bases):
+                    continue
+                if default_storage.get_modified_time(name) > cutoff:
+                    continue
+                size = default_storage.size(name)
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                removed += 1
+                freed += size
+                self.stdout.write(f"{'будет удалён' if options['dry_run'] else 'удалён'}: {name} ({size} байт)")
+
+        self.stdout.write(f"Файлов: {removed}, {freed} байт")
+
+    def is_referenced(self, name, references, referenced_bases):
+        if references[name]:
+            return True
+        if name.startswith(f'{DERIVATIVES_DIR}/'):
+            # derivatives/<имя оригинала без расширения>/<размер>.<формат>
+            base = os.path.dirname(name)[len(DERIVATIVES_DIR) + 1:]
+            return base in referenced_bases
+        for suffix in VARIANT_SUFFIXES:
+            if name.endswith(suffix) and references[name[:-len(suffix)]]:
+                return True
+        return False
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from car_tuning.autosave import autosave_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Записывает в базу буферы автосохранения кастомизаций, которые "
+        "больше не меняются (запускать по cron раз в минуту)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delay', type=int, default=None,
+            help="Записывать буферы старше стольких секунд "
+                 "(по умолчанию CUSTOMIZATION_AUTOSAVE_DELAY, 0 — все)"
+        )
+
+    def handle(self, *args, **options):
+        flushed = autosave_buffer.flush_due(options['delay'])
+        self.stdout.write(f"Записано кастомизаций: {len(flushed)}")
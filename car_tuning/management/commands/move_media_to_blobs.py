@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from car_tuning.cache import car_model_cache
+from car_tuning.signals import MEDIA_MODELS, file_field_names
+from car_tuning.storage import blob_hash, blob_storage
+
+
+class Command(BaseCommand):
+    help = "Переносит ранее загруженные файлы каталога в хранилище по хэшу содержимого"
+
+    def handle(self, *args, **options):
+        moved = {}
+        updated = 0
+        for model_cls in MEDIA_MODELS:
+            for field_name in file_field_names(model_cls):
+                rows = model_cls.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                for pk, name in rows.values_list('pk', field_name):
+                    if blob_hash(name):
+                        continue
+                    if name not in moved:
+                        if not default_storage.exists(name):
+                            self.stderr.write(f"{name}: файл не найден")
+                            continue
+                        with default_storage.open(name, 'rb') as file:
+                            moved[name] = blob_storage.save(name, file)
+                        self.stdout.write(f"{name} -> {moved[name]}")
+                    # update() без сигналов: файлы не меняются, меняются только имена
+                    model_cls.objects.filter(pk=pk).update(**{field_name: moved[name]})
+                    updated += 1
+
+        if updated:
+            car_model_cache.invalidate_all()
+        blobs = len(set(moved.values()))
+        self.stdout.write(
+            f"Файлов: {len(moved)}, уникальных blob: {blobs}, обновлено ссылок: {updated}.\n"
+            "Старые файлы удалит collect_media_garbage; сжатые варианты и превью для blob "
+            "построят build_compressed_variants и build_image_derivatives"
+        )
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_flags(apps, schema_editor):
+    # До этой миграции у объекта могло быть несколько флагов;
+    # оставляем первый, который раньше возвращал coming_soon_flag.first()
+    ComingSoon = apps.get_model('car_tuning', 'ComingSoon')
+    seen = set()
+    duplicate_ids = []
+    for pk, content_type_id, object_id in (
+        ComingSoon.objects.order_by('pk').values_list('pk', 'content_type_id', 'object_id')
+    ):
+        key = (content_type_id, object_id)
+        if key in seen:
+            duplicate_ids.append(pk)
+        else:
+            seen.add(key)
+    ComingSoon.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_tuning', '0003_alter_carmodel_model_3d'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_flags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='comingsoon',
+            constraint=models.UniqueConstraint(
+                fields=('content_type', 'object_id'),
+                include=('coming_soon',),
+                name='unique_coming_soon_per_object',
+            ),
+        ),
+    ]
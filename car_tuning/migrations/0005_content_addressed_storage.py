@@ -0,0 +1,99 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+import car_tuning.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_tuning', '0004_comingsoon_unique_per_object'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bumper',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='bumper',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='carbrand',
+            name='logo',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='brands/logos/', verbose_name='Логотип марки'),
+        ),
+        migrations.AlterField(
+            model_name='carmodel',
+            name='model_3d',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='cars/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='carmodel',
+            name='preview_image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='cars/preview/', verbose_name='Превью'),
+        ),
+        migrations.AlterField(
+            model_name='discs',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='discs',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='rearbumper',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='rearbumper',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='restyling',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='restyling',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='sideskirt',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='sideskirt',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='spoiler',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='spoiler',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+        migrations.AlterField(
+            model_name='tinting',
+            name='image',
+            field=models.FileField(blank=True, null=True, storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='tinting',
+            name='model_3d',
+            field=models.FileField(storage=car_tuning.storage.ContentAddressedStorage(), upload_to='parts/3d_models/', verbose_name='3D модель'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2 on 2026-10-18 11:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Промежуточные таблицы compatible_car_models создаёт Django, индексы для них
+# задаются SQL. Детали модели автомобиля выбираются по carmodel_id, а
+# (carmodel_id, <деталь>_id) даёт index-only scan без чтения таблицы
+PART_MODEL_NAMES = ('spoiler', 'discs', 'restyling', 'bumper', 'rearbumper', 'sideskirt', 'tinting')
+
+COMPATIBILITY_INDEXES = [
+    migrations.RunSQL(
+        f'CREATE INDEX {name}_compat_car_idx ON car_tuning_{name}_compatible_car_models (carmodel_id, {name}_id)',
+        f'DROP INDEX {name}_compat_car_idx',
+    )
+    for name in PART_MODEL_NAMES
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_tuning', '0005_content_addressed_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='bumper',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Передний бампер', 'verbose_name_plural': 'Передние бамперы'},
+        ),
+        migrations.AlterModelOptions(
+            name='discs',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Диски', 'verbose_name_plural': 'Диски'},
+        ),
+        migrations.AlterModelOptions(
+            name='rearbumper',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Задний бампер', 'verbose_name_plural': 'Задние бамперы'},
+        ),
+        migrations.AlterModelOptions(
+            name='restyling',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Рестайлинг', 'verbose_name_plural': 'Рестайлинг'},
+        ),
+        migrations.AlterModelOptions(
+            name='sideskirt',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Боковая юбка', 'verbose_name_plural': 'Боковые юбки'},
+        ),
+        migrations.AlterModelOptions(
+            name='spoiler',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Спойлер', 'verbose_name_plural': 'Спойлеры'},
+        ),
+        migrations.AlterModelOptions(
+            name='tinting',
+            options={'ordering': ['order', 'name'], 'verbose_name': 'Тонировка', 'verbose_name_plural': 'Тонировки'},
+        ),
+        migrations.AddIndex(
+            model_name='bumper',
+            index=models.Index(fields=['order', 'name', 'id'], name='bumper_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discs',
+            index=models.Index(fields=['order', 'name', 'id'], name='discs_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rearbumper',
+            index=models.Index(fields=['order', 'name', 'id'], name='rearbumper_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restyling',
+            index=models.Index(fields=['order', 'name', 'id'], name='restyling_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sideskirt',
+            index=models.Index(fields=['order', 'name', 'id'], name='sideskirt_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spoiler',
+            index=models.Index(fields=['order', 'name', 'id'], name='spoiler_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tinting',
+            index=models.Index(fields=['order', 'name', 'id'], name='tinting_order_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercarcustomization',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='customization_user_updated_idx'),
+        ),
+        *COMPATIBILITY_INDEXES,
+    ]
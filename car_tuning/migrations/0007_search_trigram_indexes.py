@@ -0,0 +1,40 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Триграммные GIN-индексы для /api/search/ (см. search.py). Выражение
+# UPPER(name) совпадает с тем, что строят icontains/contains по Upper('name'),
+# поэтому индекс работает и для LIKE '%q%', и для оператора похожести %.
+# На других базах (SQLite в разработке) поиск идёт без индекса
+SEARCH_TABLES = (
+    'carbrand', 'carmodel',
+    'spoiler', 'discs', 'restyling', 'bumper', 'rearbumper', 'sideskirt', 'tinting',
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX {name}_name_trgm_idx ON car_tuning_{name} USING gin (UPPER(name) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_TABLES:
+        schema_editor.execute(f'DROP INDEX {name}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('car_tuning', '0006_query_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 
+from .storage import blob_storage
+
 
 class ComingSoon(models.Model):
     coming_soon = models.BooleanField(default=False, verbose_name="Скоро появится")
@@ -13,11 +15,26 @@ class ComingSoon(models.Model):
     class Meta:
         verbose_name = "Флаг Скоро"
         verbose_name_plural = "Флаги Скоро"
+        constraints = [
+            # Один флаг на объект; include делает выборку флага index-only
+            models.UniqueConstraint(
+                fields=['content_type', 'object_id'],
+                include=['coming_soon'],
+                name='unique_coming_soon_per_object',
+            ),
+        ]
+
+
+class CarBrandQuerySet(models.QuerySet):
+    def with_model_count(self):
+        return self.annotate(model_count=models.Count('models'))
 
 
 class CarBrand(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название марки")
-    logo = models.FileField(upload_to='brands/logos/', verbose_name="Логотип марки")
+    logo = models.FileField(upload_to='brands/logos/', storage=blob_storage, verbose_name="Логотип марки")
+
+    objects = CarBrandQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -30,8 +47,12 @@ class CarBrand(models.Model):
 class CarModel(models.Model):
     brand = models.ForeignKey(CarBrand, on_delete=models.CASCADE, related_name='models', verbose_name="Бренд")
     name = models.CharField(max_length=100, verbose_name="Название модели")
-    model_3d = models.FileField(upload_to='cars/3d_models/', verbose_name="3D модель", blank=True, null=True)
-    preview_image = models.FileField(upload_to='cars/preview/', blank=True, null=True, verbose_name="Превью")
+    model_3d = models.FileField(
+        upload_to='cars/3d_models/', storage=blob_storage, verbose_name="3D модель", blank=True, null=True
+    )
+    preview_image = models.FileField(
+        upload_to='cars/preview/', storage=blob_storage, blank=True, null=True, verbose_name="Превью"
+    )
     coming_soon_flag = GenericRelation(ComingSoon)
 
     def __str__(self):
@@ -44,8 +65,10 @@ class CarModel(models.Model):
 
 class BaseCarPart(models.Model):
     name = models.CharField(max_length=200, verbose_name="Название детали")
-    model_3d = models.FileField(upload_to='parts/3d_models/', verbose_name="3D модель")
-    image = models.FileField(upload_to='parts/images/', verbose_name="Изображение", blank=True, null=True)
+    model_3d = models.FileField(upload_to='parts/3d_models/', storage=blob_storage, verbose_name="3D модель")
+    image = models.FileField(
+        upload_to='parts/images/', storage=blob_storage, verbose_name="Изображение", blank=True, null=True
+    )
     compatible_car_models = models.ManyToManyField(
         CarModel,
         related_name='%(class)s_compatible',
@@ -56,6 +79,10 @@ class BaseCarPart(models.Model):
     class Meta:
         abstract = True
         ordering = ['order', 'name']
+        indexes = [
+            # Списки деталей и курсорная пагинация (order, name, id)
+            models.Index(fields=['order', 'name', 'id'], name='%(class)s_order_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -64,7 +91,7 @@ class BaseCarPart(models.Model):
 class Spoiler(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Спойлер"
         verbose_name_plural = "Спойлеры"
 
@@ -72,7 +99,7 @@ class Spoiler(BaseCarPart):
 class Discs(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Диски"
         verbose_name_plural = "Диски"
 
@@ -80,7 +107,7 @@ class Discs(BaseCarPart):
 class Restyling(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Рестайлинг"
         verbose_name_plural = "Рестайлинг"
 
@@ -88,7 +115,7 @@ class Restyling(BaseCarPart):
 class Bumper(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Передний бампер"
         verbose_name_plural = "Передние бамперы"
 
@@ -96,7 +123,7 @@ class Bumper(BaseCarPart):
 class RearBumper(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Задний бампер"
         verbose_name_plural = "Задние бамперы"
 
@@ -104,7 +131,7 @@ class RearBumper(BaseCarPart):
 class SideSkirt(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Боковая юбка"
         verbose_name_plural = "Боковые юбки"
 
@@ -112,11 +139,14 @@ class SideSkirt(BaseCarPart):
 class Tinting(BaseCarPart):
     coming_soon_flag = GenericRelation(ComingSoon)
 
-    class Meta:
+    class Meta(BaseCarPart.Meta):
         verbose_name = "Тонировка"
         verbose_name_plural = "Тонировки"
 
 
+PART_MODELS = (Spoiler, Discs, Restyling, Bumper, RearBumper, SideSkirt, Tinting)
+
+
 class Color(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название цвета")
     hex_code = models.CharField(max_length=7, verbose_name="Код цвета (HEX)")
@@ -219,3 +249,7 @@ class UserCarCustomization(models.Model):
     class Meta:
         verbose_name = "Кастомизация пользователя"
         verbose_name_plural = "Кастомизации пользователей"
+        indexes = [
+            # Список кастомизаций пользователя: filter(user).order_by('-updated_at', '-id')
+            models.Index(fields=['user', '-updated_at', '-id'], name='customization_user_updated_idx'),
+        ]
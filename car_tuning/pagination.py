@@ -0,0 +1,150 @@
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import remove_query_param
+
+
+def reverse_ordering(ordering):
+    """Обратный порядок: 'a' <-> '-a' для каждого поля."""
+    return tuple(order[1:] if order.startswith('-') else f'-{order}' for order in ordering)
+
+
+def _position_default(value):
+    # Полная точность: DjangoJSONEncoder обрезает микросекунды,
+    # а позиция должна точно совпадать со значением в базе
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Unsupported position value: {value!r}")
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по всем полям сортировки.
+
+    Стандартная CursorPagination хранит в курсоре только первое поле сортировки
+    и при повторяющихся значениях догоняет нужную строку через OFFSET.
+    Здесь курсор — значения всех полей ordering, а страница выбирается условием
+    (a, b, id) > (x, y, z), поэтому запрос идёт по индексу без OFFSET и COUNT(*).
+    Последнее поле ordering должно быть уникальным.
+    """
+    page_size = settings.CATALOG_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.CATALOG_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        self.current_position = self.decode_position(self.cursor, queryset.model)
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.current_position is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, self.current_position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = self.current_position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def keyset_filter(self, ordering, position):
+        """
+        Строки строго после позиции в порядке ordering:
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z).
+        """
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field_name}__{lookup}': value})
+            equal &= Q(**{field_name: value})
+        return condition
+
+    def decode_position(self, cursor, model):
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Значения приводятся к типам полей сортировки: подделанный курсор
+        # с чужими типами — 404, а не ошибка базы в keyset_filter
+        values = []
+        for order, value in zip(self.ordering, position):
+            field = model._meta.get_field(order.lstrip('-'))
+            try:
+                value = field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return json.dumps(values, default=_position_default, ensure_ascii=False)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Назад от позиции ничего не нашлось — следующая страница первая
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Вперёд от позиции ничего не нашлось — предыдущая страница последняя
+            return self.encode_cursor(Cursor(offset=0, reverse=True, position=None))
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+
+class CarModelPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class PartPagination(KeysetPagination):
+    ordering = ('order', 'name', 'id')
+
+
+class CustomizationPagination(KeysetPagination):
+    ordering = ('-updated_at', '-id')
+    page_size = settings.CUSTOMIZATION_PAGE_SIZE
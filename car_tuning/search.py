@@ -0,0 +1,124 @@
+"""
+Поиск по каталогу (/api/search/?q=...): бренды, модели автомобилей и детали по названию.
+
+Все таблицы ищутся одним запросом UNION ALL. На PostgreSQL названия ищутся
+по триграммным GIN-индексам на UPPER(name) (миграция 0007): подстрока —
+LIKE '%q%', опечатки — оператор похожести %. Ранжирование: сначала названия,
+начинающиеся с запроса, затем содержащие его, затем похожие; внутри —
+по триграммной похожести и названию. На других базах — icontains без индекса.
+
+?car_model_id= ограничивает поиск деталями, совместимыми с моделью,
+?types=spoiler,discs — типами результатов, ?limit= — их количеством.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, CharField, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Upper
+from rest_framework.exceptions import ValidationError
+
+from .compatibility import compatibility_index
+from .fastpath import CatalogFileField
+from .fieldsets import parse_names, select
+from .models import CarBrand, CarModel, Spoiler, Discs, Restyling, Bumper, RearBumper, SideSkirt, Tinting
+
+
+# Тип результата: (модель, поле изображения). Типы деталей — как в update_part
+SEARCH_TYPES = {
+    'brand': (CarBrand, 'logo'),
+    'model': (CarModel, 'preview_image'),
+    'spoiler': (Spoiler, 'image'),
+    'discs': (Discs, 'image'),
+    'restyling': (Restyling, 'image'),
+    'bumper': (Bumper, 'image'),
+    'rear_bumper': (RearBumper, 'image'),
+    'side_skirt': (SideSkirt, 'image'),
+    'tinting': (Tinting, 'image'),
+}
+PART_TYPES = tuple(search_type for search_type in SEARCH_TYPES if search_type not in ('brand', 'model'))
+
+PREFIX, SUBSTRING, SIMILAR = 2, 1, 0
+
+
+def search_queryset(search_type, query, car_model_id=None):
+    """Строки (id, name, type, image_path, rank, similarity) одного типа."""
+    model, image_field = SEARCH_TYPES[search_type]
+    queryset = model.objects.order_by()
+    if car_model_id is not None:
+        queryset = queryset.filter(pk__in=compatibility_index.part_ids(model, car_model_id))
+
+    if connections[queryset.db].vendor == 'postgresql':
+        # Выражение совпадает с индексом name_trgm_idx
+        term = query.upper()
+        queryset = queryset.alias(search_name=Upper('name')).filter(
+            Q(search_name__contains=term) | Q(search_name__trigram_similar=term)
+        )
+        rank = Case(
+            When(search_name__startswith=term, then=Value(PREFIX)),
+            When(search_name__contains=term, then=Value(SUBSTRING)),
+            default=Value(SIMILAR),
+            output_field=IntegerField(),
+        )
+        similarity = TrigramSimilarity(Upper('name'), term)
+    else:
+        queryset = queryset.filter(name__icontains=query)
+        rank = Case(
+            When(name__istartswith=query, then=Value(PREFIX)),
+            default=Value(SUBSTRING),
+            output_field=IntegerField(),
+        )
+        similarity = Value(0.0, output_field=FloatField())
+
+    return queryset.annotate(
+        type=Value(search_type, output_field=CharField()),
+        image_path=F(image_field),
+        rank=rank,
+        similarity=similarity,
+    ).values('id', 'name', 'type', 'image_path', 'rank', 'similarity')
+
+
+def parse_search_params(request):
+    """(запрос, типы, id модели автомобиля, limit) из параметров; ошибки — 400."""
+    query = request.GET.get('q', '').strip()
+    if len(query) < settings.CATALOG_SEARCH_MIN_LENGTH:
+        raise ValidationError({'q': [f'Минимум {settings.CATALOG_SEARCH_MIN_LENGTH} символа']})
+
+    car_model_id = request.GET.get('car_model_id')
+    if car_model_id is not None:
+        if not car_model_id.isdigit():
+            raise ValidationError({'car_model_id': ['Ожидается id модели автомобиля']})
+        car_model_id = int(car_model_id)
+
+    allowed = PART_TYPES if car_model_id is not None else tuple(SEARCH_TYPES)
+    types = parse_names(request, 'types')
+    types = allowed if types is None else select(types, allowed, 'types')
+
+    limit = request.GET.get('limit', str(settings.CATALOG_SEARCH_LIMIT))
+    if not limit.isdigit() or not 1 <= int(limit) <= settings.CATALOG_SEARCH_MAX_LIMIT:
+        raise ValidationError({'limit': [f'От 1 до {settings.CATALOG_SEARCH_MAX_LIMIT}']})
+    return query, types, car_model_id, int(limit)
+
+
+def search_catalog(request):
+    """Найденные объекты каталога по убыванию релевантности."""
+    query, types, car_model_id, limit = parse_search_params(request)
+    if not types:
+        return []
+
+    querysets = [search_queryset(search_type, query, car_model_id) for search_type in types]
+    rows = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    rows = rows.order_by('-rank', '-similarity', 'name', 'type', 'id')
+
+    image_field = CatalogFileField()
+    context = {'request': request}
+    results = []
+    for row in rows[:limit]:
+        model, image_field_name = SEARCH_TYPES[row['type']]
+        image = None
+        if row['image_path']:
+            image = image_field.fast_representation(
+                FieldFile(None, model._meta.get_field(image_field_name), row['image_path']), context
+            )
+        results.append({'type': row['type'], 'id': row['id'], 'name': row['name'], 'image': image})
+    return results
@@ -1,69 +1,123 @@
 from rest_framework import serializers
-from django.db.models import Count
+from django.db import models
+from django.db.models import CharField, Count, Value
 from .models import (
     CarBrand, CarModel, Spoiler, Discs, Restyling, Bumper,
     RearBumper, SideSkirt, Tinting, Color, UserCarCustomization
 )
+from .compatibility import compatibility_index
+from .flags import get_coming_soon, load_coming_soon, resolve_coming_soon, flag_key
+from .fastpath import FastSerializerMixin
+from .fieldsets import SparseFieldsMixin
+from .assets import AssetFileField
+from .images import ImageSetField
 
 
-class ColorSerializer(serializers.ModelSerializer):
+class ComingSoonListSerializer(serializers.ListSerializer):
+    """
+    Перед сериализацией списка загружает флаги «Скоро» для всех его объектов
+    одним запросом и кладёт их в общий контекст (ключ coming_soon_flags).
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+
+        flags = self.context.setdefault('coming_soon_flags', {})
+        missing = [obj for obj in items if flag_key(obj) not in flags]
+        if missing:
+            flags.update(resolve_coming_soon(missing))
+
+        return [self.child.to_representation(item) for item in items]
+
+
+class ComingSoonSerializerMixin:
+    """Поле coming_soon: флаги берутся из контекста (coming_soon_flags) или догружаются."""
+
+    def get_coming_soon(self, obj):
+        return get_coming_soon(obj, self.context.get('coming_soon_flags'))
+
+    @classmethod
+    def resolve_coming_soon(cls, pks, context):
+        flags = context.setdefault('coming_soon_flags', {})
+        model = cls.Meta.model
+        missing = [pk for pk in pks if (model, pk) not in flags]
+        if missing:
+            flags.update(load_coming_soon({model: missing}))
+        return {pk: flags[model, pk] for pk in pks}
+
+
+class ColorSerializer(FastSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Color
         fields = ['id', 'name', 'hex_code']
 
 
-class CarBrandSerializer(serializers.ModelSerializer):
+class CarBrandSerializer(FastSerializerMixin, serializers.ModelSerializer):
+    logo_set = ImageSetField(source='logo')
     model_count = serializers.SerializerMethodField()
 
     class Meta:
         model = CarBrand
-        fields = ['id', 'name', 'logo', 'model_count']
+        fields = ['id', 'name', 'logo', 'logo_set', 'model_count']
 
     def get_model_count(self, obj):
-        return obj.models.count()
-
-
-class CarModelSerializer(serializers.ModelSerializer):
+        # Берём аннотацию CarBrand.objects.with_model_count(), если она есть
+        model_count = getattr(obj, 'model_count', None)
+        if model_count is None:
+            model_count = obj.models.count()
+        return model_count
+
+    @classmethod
+    def resolve_model_count(cls, pks, context):
+        counts = dict(
+            CarModel.objects
+            .filter(brand_id__in=pks)
+            .values('brand_id')
+            .annotate(count=Count('pk'))
+            .values_list('brand_id', 'count')
+        )
+        return {pk: counts.get(pk, 0) for pk in pks}
+
+
+class CarModelSerializer(SparseFieldsMixin, ComingSoonSerializerMixin, FastSerializerMixin, serializers.ModelSerializer):
     """
     Универсальный сериализатор для моделей автомобилей.
     При detail=True включает полный объект brand, иначе только brand_name.
+    fields — выборочные поля (см. fieldsets.py).
     """
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     brand = CarBrandSerializer(read_only=True)
+    model_3d = AssetFileField(read_only=True)
+    preview_image_set = ImageSetField(source='preview_image')
     coming_soon = serializers.SerializerMethodField()
 
     class Meta:
         model = CarModel
-        fields = ['id', 'name', 'brand', 'brand_name', 'model_3d', 'preview_image', 'coming_soon']
+        fields = ['id', 'name', 'brand', 'brand_name', 'model_3d', 'preview_image', 'preview_image_set', 'coming_soon']
+        list_serializer_class = ComingSoonListSerializer
 
     def __init__(self, *args, **kwargs):
         # Извлекаем параметр detail, по умолчанию False
         self.detail = kwargs.pop('detail', False)
         super().__init__(*args, **kwargs)
 
-        # Если не detail-представление, убираем лишние поля
-        if not self.detail:
-            self.fields.pop('brand')
-            self.fields.pop('model_3d')
-        else:
-            # Если detail-представление, убираем brand_name (т.к. есть полный brand)
-            if 'brand_name' in self.fields:
-                self.fields.pop('brand_name')
-
-    def get_coming_soon(self, obj):
-        flag = obj.coming_soon_flag.first()
-        return flag.coming_soon if flag else False
+    def get_field_names(self, declared_fields, info):
+        # Лишние поля отбрасываются до построения полей:
+        # в detail-представлении brand_name (т.к. есть полный brand), иначе brand и model_3d
+        field_names = super().get_field_names(declared_fields, info)
+        excluded = ('brand_name',) if self.detail else ('brand', 'model_3d')
+        return [name for name in field_names if name not in excluded]
 
 
-class BaseCarPartSerializer(serializers.ModelSerializer):
+class BaseCarPartSerializer(SparseFieldsMixin, ComingSoonSerializerMixin, FastSerializerMixin, serializers.ModelSerializer):
+    model_3d = AssetFileField(read_only=True)
+    image_set = ImageSetField(source='image')
     coming_soon = serializers.SerializerMethodField()
 
     class Meta:
-        fields = ['id', 'name', 'model_3d', 'image', 'coming_soon']
-
-    def get_coming_soon(self, obj):
-        flag = obj.coming_soon_flag.first()
-        return flag.coming_soon if flag else False
+        fields = ['id', 'name', 'model_3d', 'image', 'image_set', 'coming_soon']
+        list_serializer_class = ComingSoonListSerializer
 
 
 class SpoilerSerializer(BaseCarPartSerializer):
@@ -109,7 +163,7 @@ class CarModelDetailSerializer(CarModelSerializer):
 
     class Meta(CarModelSerializer.Meta):
         model = CarModel
-        fields = ['id', 'name', 'brand', 'model_3d', 'preview_image', 'coming_soon']
+        fields = ['id', 'name', 'brand', 'model_3d', 'preview_image', 'preview_image_set', 'coming_soon']
 
 
 class UserCarCustomizationListSerializer(serializers.ModelSerializer):
@@ -140,6 +194,18 @@ class UserCarCustomizationDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        # Флаги «Скоро» модели и всех выбранных деталей — одним запросом
+        flags = self.context.setdefault('coming_soon_flags', {})
+        objects = [instance.car_model] + [
+            getattr(instance, field_name)
+            for field_name in ('tinting', 'spoiler', 'discs', 'restyling', 'bumper', 'rear_bumper', 'side_skirt')
+        ]
+        missing = [obj for obj in objects if obj is not None and flag_key(obj) not in flags]
+        if missing:
+            flags.update(resolve_coming_soon(missing))
+        return super().to_representation(instance)
+
 
 class UserCarCustomizationUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -154,13 +220,110 @@ class UserCarCustomizationUpdateSerializer(serializers.ModelSerializer):
 
         for field_name in ['spoiler', 'discs', 'restyling', 'bumper', 'rear_bumper', 'side_skirt', 'tinting']:
             part = data.get(field_name)
-            if part and not part.compatible_car_models.filter(id=car_model.id).exists():
+            if part and not compatibility_index.is_compatible(part, car_model.id):
                 raise serializers.ValidationError({
                     field_name: f"Эта деталь несовместима с выбранной моделью автомобиля ({car_model})"
                 })
 
         return data
 
+    def update(self, instance, validated_data):
+        # Пишем только переданные поля
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+class UserCarCustomizationDeltaSerializer(serializers.ModelSerializer):
+    """
+    Краткий ответ на запись: id, изменённые поля (детали — только id) и updated_at.
+    Набор изменённых полей передаётся в fields.
+    """
+
+    class Meta:
+        model = UserCarCustomization
+        fields = [
+            'id', 'name', 'car_model', 'color', 'tinting', 'spoiler', 'discs',
+            'restyling', 'bumper', 'rear_bumper', 'side_skirt', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        changed = kwargs.pop('fields', ())
+        super().__init__(*args, **kwargs)
+        for name in list(self.fields):
+            if name not in ('id', 'updated_at', *changed):
+                self.fields.pop(name)
+
+
+CUSTOMIZATION_PART_MODELS = {
+    'spoiler': Spoiler, 'discs': Discs,
+    'restyling': Restyling, 'bumper': Bumper,
+    'rear_bumper': RearBumper, 'side_skirt': SideSkirt,
+    'tinting': Tinting, 'color': Color,
+}
+
+
+def find_parts(car_model_id, part_ids):
+    """
+    Проверяет детали {тип: id} для модели автомобиля и возвращает типы,
+    для которых деталь существует и совместима. Совместимость проверяется
+    по индексу в памяти, существование всех деталей — одним запросом UNION.
+    """
+    compatible = {
+        part_type: part_id for part_type, part_id in part_ids.items()
+        if CUSTOMIZATION_PART_MODELS[part_type] is Color
+        or part_id in compatibility_index.part_ids(CUSTOMIZATION_PART_MODELS[part_type], car_model_id)
+    }
+    if not compatible:
+        return set()
+
+    querysets = [
+        CUSTOMIZATION_PART_MODELS[part_type].objects
+        .filter(pk=part_id)
+        .annotate(part_type=Value(part_type, output_field=CharField()))
+        .order_by()
+        .values_list('part_type', flat=True)
+        for part_type, part_id in compatible.items()
+    ]
+    return set(querysets[0].union(*querysets[1:], all=True))
+
+
+class UserCarCustomizationPartsSerializer(serializers.Serializer):
+    """
+    Замена нескольких деталей кастомизации за раз: {"parts": {"spoiler": 3, "discs": null, ...}}.
+    null снимает деталь. Сохраняются только переданные поля.
+    """
+    parts = serializers.DictField(
+        child=serializers.IntegerField(allow_null=True, min_value=1),
+        allow_empty=False,
+    )
+
+    def validate_parts(self, parts):
+        unknown = [part_type for part_type in parts if part_type not in CUSTOMIZATION_PART_MODELS]
+        if unknown:
+            raise serializers.ValidationError(
+                {part_type: f'Неизвестный тип детали: {part_type}' for part_type in unknown}
+            )
+
+        requested = {part_type: part_id for part_type, part_id in parts.items() if part_id is not None}
+        found = find_parts(self.instance.car_model_id, requested)
+        missing = set(requested) - found
+        if missing:
+            raise serializers.ValidationError({
+                part_type: f"Деталь не найдена или несовместима с выбранной моделью автомобиля ({self.instance.car_model})"
+                for part_type in sorted(missing)
+            })
+        return parts
+
+    def update(self, instance, validated_data):
+        parts = validated_data['parts']
+        for part_type, part_id in parts.items():
+            setattr(instance, f'{part_type}_id', part_id)
+        instance.save(update_fields=[*parts, 'updated_at'])
+        return instance
+
 
 class CompatiblePartsSerializer(serializers.Serializer):
     spoilers = SpoilerSerializer(many=True, read_only=True)
@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_tokens
+from .cache import car_model_cache
+from .compression import schedule_variants
+from .images import schedule_derivatives
+from .compatibility import compatibility_index
+from .models import ComingSoon, CarBrand, CarModel, Color, PART_MODELS
+
+
+MEDIA_MODELS = (CarBrand, CarModel, *PART_MODELS)
+
+
+def brand_model_ids(*brand_ids):
+    return list(CarModel.objects.filter(brand_id__in=brand_ids).values_list('pk', flat=True))
+
+
+def part_model_ids(part):
+    return list(part.compatible_car_models.values_list('pk', flat=True))
+
+
+def file_field_names(model_cls):
+    return [field.name for field in model_cls._meta.fields if isinstance(field, models.FileField)]
+
+
+# Версии кэша меняются только после коммита: иначе параллельный запрос между
+# сменой версии и коммитом соберёт ответ из старых строк под новой версией,
+# и он останется в кэше. id затронутых моделей собираются сразу, пока видны связи
+
+def invalidate_on_commit(car_model_ids):
+    car_model_ids = list(car_model_ids)
+    transaction.on_commit(lambda: car_model_cache.invalidate(car_model_ids))
+
+
+def invalidate_all_on_commit():
+    transaction.on_commit(car_model_cache.invalidate_all)
+
+
+# Модели автомобилей: в detail-ответе есть бренд с количеством моделей,
+# поэтому добавление, удаление или перенос модели меняет ответы всех моделей бренда
+
+@receiver(pre_save, sender=CarModel)
+def remember_car_model_brand(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_brand_id = (
+            CarModel.objects.filter(pk=instance.pk).values_list('brand_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=CarModel)
+@receiver(post_delete, sender=CarModel)
+def invalidate_car_model(sender, instance, **kwargs):
+    brand_ids = {instance.brand_id, getattr(instance, '_previous_brand_id', None)} - {None}
+    invalidate_on_commit([instance.pk, *brand_model_ids(*brand_ids)])
+
+
+@receiver(post_save, sender=CarBrand)
+@receiver(post_delete, sender=CarBrand)
+def invalidate_brand(sender, instance, **kwargs):
+    invalidate_on_commit(brand_model_ids(instance.pk))
+
+
+# Детали: при удалении связи M2M исчезают раньше post_delete,
+# поэтому список моделей запоминается заранее
+
+def invalidate_part(sender, instance, **kwargs):
+    invalidate_on_commit(part_model_ids(instance))
+
+
+def remember_part_models(sender, instance, **kwargs):
+    instance._compatible_model_ids = part_model_ids(instance)
+
+
+def invalidate_deleted_part(sender, instance, **kwargs):
+    invalidate_on_commit(getattr(instance, '_compatible_model_ids', []))
+
+
+def invalidate_compatibility(sender, instance, action, reverse, pk_set, **kwargs):
+    # Удаление детали или модели тоже убирает связи, но без m2m_changed;
+    # индексу это не мешает — id удалённых объектов больше не встретятся.
+    # Версия меняется после коммита, иначе другой процесс перестроит индекс
+    # по ещё не видным ему связям и оставит устаревший
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(compatibility_index.invalidate)
+
+    if reverse:
+        # Изменены детали у модели автомобиля
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_on_commit([instance.pk])
+        return
+
+    if action == 'pre_clear':
+        instance._compatible_model_ids = part_model_ids(instance)
+    elif action == 'post_clear':
+        invalidate_on_commit(getattr(instance, '_compatible_model_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_on_commit(pk_set or [])
+
+
+for part_model in PART_MODELS:
+    post_save.connect(invalidate_part, sender=part_model)
+    pre_delete.connect(remember_part_models, sender=part_model)
+    post_delete.connect(invalidate_deleted_part, sender=part_model)
+    m2m_changed.connect(invalidate_compatibility, sender=part_model.compatible_car_models.through)
+
+
+# Цвета входят в ответ compatible_parts любой модели
+
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+def invalidate_colors(sender, instance, **kwargs):
+    invalidate_all_on_commit()
+
+
+@receiver(post_save, sender=ComingSoon)
+@receiver(post_delete, sender=ComingSoon)
+def invalidate_coming_soon(sender, instance, **kwargs):
+    model_cls = instance.content_type.model_class()
+    if model_cls is CarModel:
+        invalidate_on_commit([instance.object_id])
+    elif model_cls in PART_MODELS:
+        part = model_cls(pk=instance.object_id)
+        invalidate_on_commit(part_model_ids(part))
+
+
+# Сжатые варианты (compression.py) и уменьшенные копии изображений (images.py)
+# строятся после сохранения для файлов, имена которых отличаются от сохранённых в базе
+
+def remember_file_names(sender, instance, **kwargs):
+    previous = {}
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values(*file_field_names(sender)).first() or {}
+    instance._previous_file_names = previous
+
+
+def process_uploaded_files(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_file_names', {})
+    names = [
+        getattr(instance, name).name for name in file_field_names(sender)
+        if getattr(instance, name) and getattr(instance, name).name != previous.get(name)
+    ]
+    if names:
+        transaction.on_commit(lambda: (schedule_variants(names), schedule_derivatives(names)))
+
+
+for media_model in MEDIA_MODELS:
+    pre_save.connect(remember_file_names, sender=media_model)
+    post_save.connect(process_uploaded_files, sender=media_model)
+
+
+# Пользователь: запомненные проверки его токенов (см. authentication.py)
+# не должны пережить блокировку, смену прав или удаление
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
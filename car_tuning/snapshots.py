@@ -0,0 +1,251 @@
+"""
+Статический снимок каталога: готовые и заранее сжатые JSON-ответы
+/api/brands/, /api/models/ (каждая страница курсорного списка — отдельный
+файл), /api/models/<id>/compatible_parts/ и /api/colors/.
+
+Снимок собирает команда build_catalog_snapshot в CATALOG_SNAPSHOT_ROOT/<версия>/
+и атомарно переключает на него ссылку CATALOG_SNAPSHOT_ROOT/current.
+С CATALOG_SNAPSHOT_MODE запросы без параметров к этим адресам (и страницы
+/api/models/?cursor=... по ссылкам next/previous) перехватывает
+SnapshotMiddleware до DRF и базы:
+
+    redirect — 302 на CATALOG_SNAPSHOT_URL<версия>/<файл>; файлы неизменяемы,
+               их отдаёт nginx (alias на CATALOG_SNAPSHOT_ROOT, gzip_static/brotli_static)
+    serve    — отдаёт файл сам, с вариантом по Accept-Encoding
+
+Снимок используется, только пока каталог не менялся после сборки (версия
+из catalog_revision) и хост запроса совпадает с тем, для которого он собран:
+в ответах абсолютные URL. Иначе запрос обрабатывает API. Достроенные позже
+копии изображений тоже меняют версию каталога (images.build_and_cache), так что
+снимок с null вместо набора копий перестаёт отдаваться до следующей сборки.
+"""
+import json
+import os
+import re
+import shutil
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.test import RequestFactory
+from django.urls import resolve
+from django.utils.http import parse_etags
+
+from .cache import catalog_revision
+from .compression import ENCODINGS, MAX_RATIO, SUFFIXES, compress, pick_encoding
+
+
+CURRENT = 'current'
+MANIFEST = 'manifest.json'
+
+MODELS_PATH = '/api/models/'
+STATIC_FILES = {
+    '/api/brands/': 'brands.json',
+    MODELS_PATH: 'models.json',
+    '/api/colors/': 'colors.json',
+}
+COMPATIBLE_PARTS_RE = re.compile(r'^/api/models/(?P<pk>\d+)/compatible_parts/$')
+
+
+def compatible_parts_path(pk):
+    return f'/api/models/{pk}/compatible_parts/'
+
+
+def snapshot_name(path):
+    """Имя файла снимка для адреса API или None."""
+    if path in STATIC_FILES:
+        return STATIC_FILES[path]
+    match = COMPATIBLE_PARTS_RE.match(path)
+    if match:
+        return f'models/{match.group("pk")}/compatible_parts.json'
+    return None
+
+
+def models_page_name(number):
+    return f'models/pages/{number}.json'
+
+
+def link_cursor(link):
+    """Значение cursor из ссылки next/previous или None."""
+    if not link:
+        return None
+    return dict(parse_qsl(urlsplit(link).query)).get('cursor')
+
+
+def request_factory(base_url):
+    parts = urlsplit(base_url)
+    return RequestFactory(HTTP_HOST=parts.netloc, secure=parts.scheme == 'https')
+
+
+def render(factory, path, params=None):
+    """Тело ответа API на GET-запрос без аутентификации."""
+    request = factory.get(path, params or {})
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise RuntimeError(f"{path}: статус {response.status_code}")
+    return response.content
+
+
+def render_pages(factory, path):
+    """
+    Страницы курсорного списка по ссылкам next: (курсор страницы или None
+    для первой, курсор ссылки previous, тело ответа). Страницы те же, что
+    отдаёт API с размером по умолчанию, поэтому ссылки в них ведут на снимок.
+    """
+    cursor = None
+    while True:
+        content = render(factory, path, {'cursor': cursor} if cursor else None)
+        page = json.loads(content)
+        yield cursor, link_cursor(page['previous']), content
+        cursor = link_cursor(page['next'])
+        if cursor is None:
+            break
+
+
+def build_models_pages(directory, factory):
+    """
+    Пишет страницы /api/models/. Возвращает ({имя файла: [encoding]},
+    {курсор: имя файла}) — ссылке previous страницы соответствует предыдущая.
+    """
+    files = {}
+    pages = {}
+    previous_name = None
+    for number, (cursor, previous, content) in enumerate(render_pages(factory, MODELS_PATH)):
+        name = STATIC_FILES[MODELS_PATH] if cursor is None else models_page_name(number)
+        files[name] = write_file(directory, name, content)
+        if cursor is not None:
+            pages[cursor] = name
+        if previous is not None and previous_name is not None:
+            pages[previous] = previous_name
+        previous_name = name
+    return files, pages
+
+
+def write_file(directory, name, content):
+    """Пишет файл и его сжатые варианты. Возвращает список сохранённых encoding."""
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+    encodings = []
+    for encoding, suffix, compressor in ENCODINGS:
+        compressed = compress(compressor, content)
+        if len(compressed) < len(content) * MAX_RATIO:
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_compatible_parts(directory, base_url, car_model_ids):
+    """Задача для процесса-воркера: ответы compatible_parts пачки моделей."""
+    factory = request_factory(base_url)
+    files = {}
+    for pk in car_model_ids:
+        name = snapshot_name(compatible_parts_path(pk))
+        files[name] = write_file(directory, name, render(factory, compatible_parts_path(pk)))
+    return files
+
+
+def write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST), 'w') as file:
+        json.dump(manifest, file)
+
+
+def activate(root, version):
+    """Атомарно переключает ссылку current на версию снимка."""
+    link = os.path.join(root, CURRENT)
+    tmp_link = f'{link}.{os.getpid()}.tmp'
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, link)
+
+
+def remove_old(root, keep):
+    """Удаляет снимки, кроме current и keep последних. Возвращает удалённые версии."""
+    current = os.readlink(os.path.join(root, CURRENT))
+    versions = sorted(
+        name for name in os.listdir(root)
+        if name != current and os.path.isfile(os.path.join(root, name, MANIFEST))
+    )
+    removed = versions[:max(len(versions) - keep, 0)]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version))
+    return removed
+
+
+_manifest = {'version': None, 'data': None}
+
+
+def current_manifest():
+    """Манифест текущего снимка; перечитывается только после переключения ссылки."""
+    root = settings.CATALOG_SNAPSHOT_ROOT
+    try:
+        version = os.readlink(os.path.join(root, CURRENT))
+    except OSError:
+        return None
+    if _manifest['version'] != version:
+        try:
+            with open(os.path.join(root, version, MANIFEST)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        _manifest.update(version=version, data=data)
+    return _manifest['data']
+
+
+class SnapshotMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.CATALOG_SNAPSHOT_MODE and request.method in ('GET', 'HEAD'):
+            name = cursor = None
+            if not request.GET:
+                name = snapshot_name(request.path_info)
+            elif request.path_info == MODELS_PATH and list(request.GET) == ['cursor']:
+                cursor = request.GET['cursor']
+            if name is not None or cursor is not None:
+                response = self.snapshot_response(request, name, cursor)
+                if response is not None:
+                    return response
+        return self.get_response(request)
+
+    def snapshot_response(self, request, name, cursor=None):
+        manifest = current_manifest()
+        if manifest is not None and cursor is not None:
+            name = manifest.get('pages', {}).get(cursor)
+        if (
+            manifest is None
+            or name is None
+            or name not in manifest['files']
+            or manifest['revision'] != catalog_revision()[0]
+            or manifest['base_url'] != request.build_absolute_uri('/')
+        ):
+            return None
+
+        version = manifest['version']
+        mode = settings.CATALOG_SNAPSHOT_MODE
+        if mode == 'redirect':
+            return HttpResponseRedirect(f'{settings.CATALOG_SNAPSHOT_URL}{version}/{name}')
+        if mode != 'serve':
+            raise ValueError(f"Unknown CATALOG_SNAPSHOT_MODE: {mode!r}")
+
+        encoding = pick_encoding(manifest['files'][name], request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = f'"{version}-{encoding}"' if encoding else f'"{version}"'
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            path = os.path.join(settings.CATALOG_SNAPSHOT_ROOT, version, name)
+            response = FileResponse(open(path + SUFFIXES[encoding] if encoding else path, 'rb'))
+            response['Content-Type'] = 'application/json'
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,55 @@
+"""
+Хранилище загружаемых файлов каталога с адресацией по содержимому.
+
+Файл сохраняется как blobs/<первые 2 символа хэша>/<sha256><расширение>
+независимо от upload_to, поэтому повторная загрузка того же файла не создаёт
+копию, а указывает на уже сохранённый blob. Файлы, на которые больше никто
+не ссылается, удаляет команда collect_media_garbage.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+BLOBS_DIR = 'blobs'
+BLOB_RE = re.compile(rf'^{BLOBS_DIR}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})(?P<extension>\.[^/]*)?$')
+
+
+def content_hash(content):
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def blob_name(sha256, extension):
+    return f'{BLOBS_DIR}/{sha256[:2]}/{sha256}{extension}'
+
+
+def blob_hash(name):
+    """sha256 содержимого из имени blob или None, если имя не из blobs/."""
+    match = BLOB_RE.match(name)
+    return match.group('sha256') if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage в MEDIA_ROOT, который кладёт файлы по хэшу содержимого."""
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        target = blob_name(content_hash(content), extension)
+        if self.exists(target):
+            return target
+
+        saved = super()._save(target, content)
+        if saved != target:
+            # Тот же файл параллельно сохранили под этим именем — копия не нужна
+            self.delete(saved)
+        return target
+
+
+blob_storage = ContentAddressedStorage()
@@ -1,3 +1,1182 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import uuid
+import zlib
+from concurrent.futures import Executor, Future
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.db.models import QuerySet
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import assets, async_views, snapshots
+from .assets import file_digest, parse_range
+from .authentication import verified_tokens
+from .autosave import LOCK_KEY, autosave_buffer
+from .cache import BUILD_LOCK_KEY, HIT, MISS, STALE, car_model_cache, touch_catalog
+from .compatibility import compatibility_index
+from .compression import ENCODINGS, build_variants, get_variants, pick_encoding
+from .flags import resolve_coming_soon
+from .images import build_and_cache, owner_car_model_ids
+from .loaders import COMPATIBLE_PARTS
+from .pagination import CustomizationPagination, PartPagination
+from .renderers import FastJSONRenderer
+from .serializers import CarBrandSerializer, CarModelSerializer, SpoilerSerializer
+from .views import CarModelViewSet
+from .models import (
+    ComingSoon, CarBrand, CarModel, Color, Spoiler, Discs, UserCarCustomization, PART_MODELS
+)
+
+
+# Кэш в памяти вместо файлового по умолчанию; очищается перед каждым тестом
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogTestCase(TestCase):
+    """Небольшой каталог: бренд, три модели, детали двух типов, цвет."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = CarBrand.objects.create(name='Toyota', logo='brands/logos/toyota.png')
+        cls.car_model = CarModel.objects.create(brand=cls.brand, name='Camry')
+        cls.other_model = CarModel.objects.create(brand=cls.brand, name='Corolla')
+        cls.third_model = CarModel.objects.create(brand=cls.brand, name='RAV4')
+        cls.spoiler = Spoiler.objects.create(name='Spoiler GT', model_3d='parts/3d_models/spoiler.glb')
+        cls.spoiler.compatible_car_models.add(cls.car_model)
+        cls.other_spoiler = Spoiler.objects.create(name='Spoiler Lip', model_3d='parts/3d_models/lip.glb')
+        cls.other_spoiler.compatible_car_models.add(cls.other_model)
+        cls.discs = Discs.objects.create(name='Discs R18', model_3d='parts/3d_models/discs.glb')
+        cls.discs.compatible_car_models.add(cls.car_model, cls.other_model)
+        cls.color = Color.objects.create(name='Белый', hex_code='#ffffff')
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        car_model_cache.local.clear()
+
+
+class CustomizationDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = CarBrand.objects.create(name='Toyota', logo='brands/logos/toyota.png')
+        cls.car_model = CarModel.objects.create(brand=brand, name='Camry')
+        CarModel.objects.create(brand=brand, name='Corolla')
+        ComingSoon.objects.create(content_object=cls.car_model, coming_soon=True)
+
+        cls.user = User.objects.create_user('driver', password='secret')
+        parts = {}
+        for part_model in PART_MODELS:
+            part = part_model.objects.create(name=part_model.__name__, model_3d='parts/3d_models/part.glb')
+            part.compatible_car_models.add(cls.car_model)
+            ComingSoon.objects.create(content_object=part, coming_soon=part_model is PART_MODELS[0])
+            parts[part_model._meta.model_name] = part
+
+        cls.customization = UserCarCustomization.objects.create(
+            user=cls.user,
+            car_model=cls.car_model,
+            name='Проект',
+            color=Color.objects.create(name='Белый', hex_code='#ffffff'),
+            spoiler=parts['spoiler'],
+            discs=parts['discs'],
+            restyling=parts['restyling'],
+            bumper=parts['bumper'],
+            rear_bumper=parts['rearbumper'],
+            side_skirt=parts['sideskirt'],
+            tinting=parts['tinting'],
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Типы содержимого кэшируются на процесс и в запросах не участвуют
+        ContentType.objects.get_for_models(CarModel, *PART_MODELS)
+
+    def test_detail_runs_fixed_number_of_queries(self):
+        url = reverse('customization-detail', args=[self.customization.pk])
+        # Кастомизация со всеми связями, бренд с количеством моделей, флаги «Скоро»
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['car_model']['brand']['model_count'], 2)
+        self.assertTrue(data['car_model']['coming_soon'])
+        self.assertTrue(data['spoiler']['coming_soon'])
+        self.assertFalse(data['discs']['coming_soon'])
+        self.assertEqual(data['color']['name'], 'Белый')
+
+
+class CarModelCacheInvalidationTest(CatalogTestCase):
+    def test_versions_change_only_after_commit(self):
+        url = reverse('carmodel-detail', args=[self.car_model.pk])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.car_model.name = 'Camry XV70'
+            self.car_model.save()
+            # До коммита версия прежняя: запрос не может собрать ответ под новой версией
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response.json()['name'], 'Camry')
+
+        self.assertTrue(callbacks)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['name'], 'Camry XV70')
+
+    def test_compatibility_change_invalidates_after_commit(self):
+        url = reverse('carmodel-compatible-parts', args=[self.third_model.pk])
+        self.assertEqual(self.client.get(url).json()['spoilers'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spoiler.compatible_car_models.add(self.third_model)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([part['id'] for part in response.json()['spoilers']], [self.spoiler.pk])
+
+
+class ConditionalGetTest(CatalogTestCase):
+    def test_not_modified_until_edit_is_committed(self):
+        url = reverse('carbrand-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = 'Lexus'
+            self.brand.save()
+            touch_catalog()
+            # До коммита маркер прежний
+            self.assertEqual(self.client.get(url)['ETag'], etag)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Lexus')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class CompatibilityIndexTest(CatalogTestCase):
+    def test_index_rebuilt_after_commit(self):
+        self.assertFalse(compatibility_index.is_compatible(self.spoiler, self.third_model.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spoiler.compatible_car_models.add(self.third_model)
+            self.assertFalse(compatibility_index.is_compatible(self.spoiler, self.third_model.pk))
+
+        self.assertTrue(compatibility_index.is_compatible(self.spoiler, self.third_model.pk))
+        self.assertEqual(compatibility_index.part_ids(Spoiler, self.car_model.pk), {self.spoiler.pk})
+
+
+class CustomizationTestCase(CatalogTestCase):
+    """Кастомизация модели car_model от имени её владельца."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('driver', password='secret')
+        cls.customization = UserCarCustomization.objects.create(user=cls.user, car_model=cls.car_model, name='Проект')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+
+class AutosaveTest(CustomizationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.second = UserCarCustomization.objects.create(user=cls.user, car_model=cls.car_model, name='Второй')
+
+    def test_pending_changes_are_overlaid_until_commit(self):
+        url = reverse('customization-update-part', args=[self.customization.pk])
+        response = self.client.patch(
+            f'{url}?autosave=1', {'part_type': 'spoiler', 'part_id': self.spoiler.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {
+            'id': self.customization.pk, 'spoiler': self.spoiler.pk,
+            'updated_at': response.json()['updated_at'], 'pending': True,
+        })
+        self.customization.refresh_from_db()
+        self.assertIsNone(self.customization.spoiler_id)
+
+        detail_url = reverse('customization-detail', args=[self.customization.pk])
+        self.assertEqual(self.client.get(detail_url).json()['spoiler']['id'], self.spoiler.pk)
+        list_data = self.client.get(reverse('customization-list')).json()['results']
+        self.assertIn(self.customization.pk, [item['id'] for item in list_data])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('customization-commit', args=[self.customization.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.customization.refresh_from_db()
+        self.assertEqual(self.customization.spoiler_id, self.spoiler.pk)
+        self.assertEqual(autosave_buffer.pending(self.customization.pk), {})
+
+    def test_buffer_survives_rolled_back_flush(self):
+        autosave_buffer.stage(self.customization.pk, {'name': 'Новое имя'})
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                autosave_buffer.flush(self.customization.pk)
+                raise RuntimeError
+
+        self.customization.refresh_from_db()
+        self.assertEqual(self.customization.name, 'Проект')
+        self.assertEqual(autosave_buffer.pending(self.customization.pk), {'name': 'Новое имя'})
+
+    def test_flush_due_keeps_failed_buffers(self):
+        autosave_buffer.stage(self.customization.pk, {'name': 'Записано'})
+        autosave_buffer.stage(self.second.pk, {'name': 'Ошибка'})
+        update = QuerySet.update
+
+        def failing_update(queryset, **kwargs):
+            if kwargs.get('name') == 'Ошибка':
+                raise DatabaseError('update failed')
+            return update(queryset, **kwargs)
+
+        with (
+            mock.patch.object(QuerySet, 'update', failing_update),
+            self.captureOnCommitCallbacks(execute=True),
+            self.assertLogs('car_tuning.autosave', 'ERROR'),
+        ):
+            flushed = autosave_buffer.flush_due(delay=0)
+
+        self.assertEqual(flushed, [self.customization.pk])
+        self.customization.refresh_from_db()
+        self.assertEqual(self.customization.name, 'Записано')
+        self.assertEqual(autosave_buffer.pending(self.customization.pk), {})
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.name, 'Второй')
+        self.assertEqual(autosave_buffer.pending(self.second.pk), {'name': 'Ошибка'})
+
+    def test_flush_due_skips_locked_buffer(self):
+        autosave_buffer.stage(self.customization.pk, {'name': 'Занято'})
+        cache.add(LOCK_KEY.format(self.customization.pk), 1)
+        with mock.patch('car_tuning.autosave.LOCK_TIMEOUT', 0.05):
+            self.assertEqual(autosave_buffer.flush_due(delay=0), [])
+        self.assertEqual(autosave_buffer.pending(self.customization.pk), {'name': 'Занято'})
+
+
+class CompatiblePartsLoadingTest(CatalogTestCase):
+    def test_compatible_parts_grouped_by_type(self):
+        response = self.client.get(reverse('carmodel-compatible-parts', args=[self.car_model.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data), {*COMPATIBLE_PARTS, 'colors'})
+        self.assertEqual([part['id'] for part in data['spoilers']], [self.spoiler.pk])
+        self.assertEqual([part['id'] for part in data['discs']], [self.discs.pk])
+        self.assertEqual(data['bumpers'], [])
+        self.assertEqual([color['id'] for color in data['colors']], [self.color.pk])
+
+    def test_list_queries_do_not_grow_with_models(self):
+        ContentType.objects.get_for_models(CarModel, *PART_MODELS)
+        url = reverse('carmodel-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        data = {item['id']: item for item in response.json()['results']}
+        self.assertEqual([part['id'] for part in data[self.other_model.pk]['spoilers']], [self.other_spoiler.pk])
+        self.assertEqual([part['id'] for part in data[self.third_model.pk]['discs']], [])
+
+        for number in range(3):
+            model = CarModel.objects.create(brand=self.brand, name=f'Model {number}')
+            self.discs.compatible_car_models.add(model)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 6)
+
+
+class KeysetPaginationTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Повторяющиеся order и name: порядок различает только id
+        for name in ('Spoiler GT', 'Spoiler GT', 'Spoiler A', 'Spoiler Z'):
+            Spoiler.objects.create(name=name, model_3d='parts/3d_models/spoiler.glb', order=1)
+
+    def collect(self, url, link):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([item['id'] for item in data['results']])
+            url = data[link]
+        return pages
+
+    def test_pages_follow_ordering_in_both_directions(self):
+        expected = list(Spoiler.objects.order_by('order', 'name', 'id').values_list('id', flat=True))
+        forward = self.collect(f"{reverse('spoiler-list')}?page_size=2", 'next')
+        self.assertEqual([len(page) for page in forward], [2, 2, 2])
+        self.assertEqual([pk for page in forward for pk in page], expected)
+
+        last_page = self.client.get(f"{reverse('spoiler-list')}?page_size=2").json()
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).json()
+        backward = self.collect(last_page['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('spoiler-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_is_not_found(self):
+        paginator = PartPagination()
+        for position in (['x', 'Spoiler GT', 1], [0, 'Spoiler GT', 'abc'], [0, None, 1], [0, 'Spoiler GT']):
+            paginator.base_url = f"http://testserver{reverse('spoiler-list')}"
+            url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(position)))
+            with self.subTest(position=position):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+        user = User.objects.create_user('driver', password='secret')
+        self.client.force_authenticate(user)
+        paginator = CustomizationPagination()
+        paginator.base_url = f"http://testserver{reverse('customization-list')}"
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=json.dumps(['yesterday', 1])))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_datetime_cursor_round_trip(self):
+        user = User.objects.create_user('driver', password='secret')
+        created = [
+            UserCarCustomization.objects.create(user=user, car_model=self.car_model, name=f'Проект {number}').pk
+            for number in range(3)
+        ]
+        self.client.force_authenticate(user)
+        pages = self.collect(f"{reverse('customization-list')}?page_size=2", 'next')
+        self.assertEqual([pk for page in pages for pk in page], created[::-1])
+
+
+class FastPathTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ComingSoon.objects.create(content_object=cls.other_model, coming_soon=True)
+        ComingSoon.objects.create(content_object=cls.spoiler, coming_soon=True)
+
+    def assertSameOutput(self, serializer_class, queryset, **kwargs):
+        context = {'request': APIRequestFactory().get('/')}
+        plan = serializer_class.get_fast_plan(**kwargs)
+        self.assertIsNotNone(plan)
+        fast = plan.serialize(plan.values(queryset), context)
+        regular = serializer_class(queryset, many=True, context=context, **kwargs).data
+        renderer = FastJSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(regular))
+
+    def test_plan_matches_serializer(self):
+        self.assertSameOutput(CarModelSerializer, CarModelViewSet.queryset.order_by('pk'), detail=True)
+        self.assertSameOutput(CarModelSerializer, CarModel.objects.order_by('pk'))
+        self.assertSameOutput(CarBrandSerializer, CarBrand.objects.with_model_count().order_by('pk'))
+        self.assertSameOutput(SpoilerSerializer, Spoiler.objects.order_by('pk'))
+
+    def test_plan_respects_selected_fields(self):
+        self.assertSameOutput(CarModelSerializer, CarModel.objects.order_by('pk'), detail=True, fields=('id', 'name'))
+
+
+class UpdatePartsTest(CustomizationTestCase):
+    def update_parts(self, parts):
+        url = reverse('customization-update-parts', args=[self.customization.pk])
+        return self.client.patch(url, {'parts': parts}, format='json')
+
+    def test_parts_replaced_in_one_request(self):
+        response = self.update_parts({'spoiler': self.spoiler.pk, 'discs': self.discs.pk, 'color': self.color.pk})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['spoiler']['id'], self.spoiler.pk)
+        self.assertEqual(data['color']['id'], self.color.pk)
+        self.customization.refresh_from_db()
+        self.assertEqual(
+            (self.customization.spoiler_id, self.customization.discs_id, self.customization.color_id),
+            (self.spoiler.pk, self.discs.pk, self.color.pk),
+        )
+
+        response = self.update_parts({'spoiler': None})
+        self.assertEqual(response.status_code, 200)
+        self.customization.refresh_from_db()
+        self.assertIsNone(self.customization.spoiler_id)
+        self.assertEqual(self.customization.discs_id, self.discs.pk)
+
+    def test_incompatible_part_rejects_whole_request(self):
+        response = self.update_parts({'spoiler': self.other_spoiler.pk, 'discs': self.discs.pk})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['parts']), {'spoiler'})
+        self.customization.refresh_from_db()
+        self.assertIsNone(self.customization.discs_id)
+
+    def test_unknown_part_type(self):
+        response = self.update_parts({'wing': self.spoiler.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('wing', response.json()['parts'])
+
+
+class DeltaResponseTest(CustomizationTestCase):
+    def test_delta_by_query_param(self):
+        url = reverse('customization-detail', args=[self.customization.pk])
+        response = self.client.patch(f'{url}?response=delta', {'name': 'Новое имя'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'id', 'name', 'updated_at'})
+        self.assertEqual(response.json()['name'], 'Новое имя')
+        self.assertFalse(response.has_header('Preference-Applied'))
+
+    def test_delta_by_prefer_header(self):
+        url = reverse('customization-update-part', args=[self.customization.pk])
+        response = self.client.patch(
+            url, {'part_type': 'spoiler', 'part_id': self.spoiler.pk}, format='json',
+            HTTP_PREFER='return=minimal',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'id': self.customization.pk, 'spoiler': self.spoiler.pk, 'updated_at': response.json()['updated_at'],
+        })
+        self.assertEqual(response['Preference-Applied'], 'return=minimal')
+
+    def test_full_response_by_default(self):
+        url = reverse('customization-update-part', args=[self.customization.pk])
+        response = self.client.patch(url, {'part_type': 'spoiler', 'part_id': self.spoiler.pk}, format='json')
+        self.assertEqual(response.json()['spoiler']['id'], self.spoiler.pk)
+        self.assertIn('car_model', response.json())
+
+
+class ResponseCacheTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        car_model_cache.reset_stats()
+
+    def get(self, kind, build):
+        return car_model_cache.get_or_build(self.car_model.pk, kind, 'variant', build)
+
+    def test_stale_response_while_another_worker_builds(self):
+        self.assertEqual(self.get('detail', lambda: {'name': 'old'}), ({'name': 'old'}, MISS))
+        self.assertEqual(self.get('detail', mock.Mock()), ({'name': 'old'}, HIT))
+
+        car_model_cache.invalidate([self.car_model.pk])
+        key = car_model_cache._payload_key(self.car_model.pk, 'detail', 'variant')
+        cache.add(BUILD_LOCK_KEY.format(key), 1)
+        build = mock.Mock()
+        self.assertEqual(self.get('detail', build), ({'name': 'old'}, STALE))
+        build.assert_not_called()
+
+    def test_builds_itself_after_short_wait(self):
+        key = car_model_cache._payload_key(self.car_model.pk, 'detail', 'variant')
+        cache.add(BUILD_LOCK_KEY.format(key), 1)
+        with mock.patch('car_tuning.cache.BUILD_WAIT_TIMEOUT', 0.05):
+            self.assertEqual(self.get('detail', lambda: {'name': 'new'}), ({'name': 'new'}, MISS))
+
+    def test_stats(self):
+        self.get('detail', lambda: {})
+        self.get('detail', lambda: {})
+        self.get('detail', lambda: {})
+
+        stats = car_model_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stale']), (2, 1, 0))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+
+
+class AuthenticationDispatchTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('driver', password='secret')
+
+    def setUp(self):
+        super().setUp()
+        verified_tokens.clear()
+        self.url = reverse('customization-list')
+
+    def get(self, authorization=None):
+        if authorization is None:
+            return self.client.get(self.url)
+        return self.client.get(self.url, HTTP_AUTHORIZATION=authorization)
+
+    def test_jwt_bearer_token(self):
+        token = f'Bearer {AccessToken.for_user(self.user)}'
+        self.assertEqual(self.get(token).status_code, 200)
+        # Повторный запрос с тем же токеном не ищет пользователя в базе
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(token).status_code, 200)
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries))
+
+    def test_invalid_tokens_are_rejected(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get('Bearer unknown-opaque-token').status_code, 401)
+        self.assertEqual(self.get('Bearer aaa.bbb.ccc').status_code, 401)
+        self.assertEqual(self.get('Basic ZHJpdmVyOnNlY3JldA==').status_code, 401)
+
+    def test_blank_header_is_anonymous(self):
+        self.assertEqual(self.get('   ').status_code, 401)
+        self.assertEqual(self.client.get(reverse('carbrand-list'), HTTP_AUTHORIZATION=' \t ').status_code, 200)
+
+    def test_deactivated_user_loses_cached_token(self):
+        token = f'Bearer {AccessToken.for_user(self.user)}'
+        self.assertEqual(self.get(token).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get(token).status_code, 401)
+
+
+class FieldSelectionTest(CatalogTestCase):
+    def test_fields_limit_list_keys(self):
+        response = self.client.get(reverse('carmodel-list'), {'fields': 'name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0], {'id': self.car_model.pk, 'name': 'Camry'})
+
+        response = self.client.get(reverse('spoiler-list'), {'fields': 'id,name'})
+        self.assertEqual({tuple(item) for item in response.json()['results']}, {('id', 'name')})
+
+    def test_expand_adds_part_groups(self):
+        url = reverse('carmodel-detail', args=[self.car_model.pk])
+        data = self.client.get(url, {'fields': 'name', 'expand': 'spoilers'}).json()
+        self.assertEqual(set(data), {'id', 'name', 'spoilers'})
+        self.assertEqual([part['id'] for part in data['spoilers']], [self.spoiler.pk])
+
+        data = self.client.get(url, {'expand': 'discs'}).json()
+        self.assertIn('brand', data)
+        self.assertIn('discs', data)
+        self.assertNotIn('spoilers', data)
+
+        self.assertTrue(set(COMPATIBLE_PARTS) <= set(self.client.get(url).json()))
+
+    def test_compatible_parts_selection(self):
+        url = reverse('carmodel-compatible-parts', args=[self.car_model.pk])
+        self.assertEqual(set(self.client.get(url, {'fields': 'spoilers,colors'}).json()), {'spoilers', 'colors'})
+        self.assertEqual(set(self.client.get(url, {'expand': 'discs'}).json()), {'discs', 'colors'})
+
+    def test_selection_has_own_cache_entry(self):
+        url = reverse('carmodel-detail', args=[self.car_model.pk])
+        self.assertIn('brand', self.client.get(url).json())
+        self.assertEqual(set(self.client.get(url, {'fields': 'name'}).json()), {'id', 'name'})
+
+    def test_unknown_names_are_rejected(self):
+        url = reverse('carmodel-detail', args=[self.car_model.pk])
+        response = self.client.get(url, {'fields': 'name,price'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+        response = self.client.get(url, {'expand': 'wings'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('expand', response.json())
+
+        response = self.client.get(reverse('spoiler-list'), {'expand': 'spoilers'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogSearchTest(CatalogTestCase):
+    def search(self, **params):
+        return self.client.get(reverse('catalog-search'), params)
+
+    def found(self, **params):
+        response = self.search(**params)
+        self.assertEqual(response.status_code, 200)
+        return [(item['type'], item['id']) for item in response.json()['results']]
+
+    def test_matches_all_types_by_relevance(self):
+        self.assertEqual(self.found(q='toy'), [('brand', self.brand.pk)])
+        light = Discs.objects.create(name='Light R17', model_3d='parts/3d_models/light.glb')
+        # Сначала названия, которые начинаются с запроса, затем содержащие его
+        self.assertEqual(self.found(q='li'), [('discs', light.pk), ('spoiler', self.other_spoiler.pk)])
+        self.assertEqual(self.found(q='r1'), [('discs', self.discs.pk), ('discs', light.pk)])
+
+    def test_compatible_parts_only(self):
+        self.assertEqual(self.found(q='spoiler', car_model_id=self.car_model.pk), [('spoiler', self.spoiler.pk)])
+        self.assertEqual(self.found(q='spoiler', car_model_id=self.third_model.pk), [])
+        # С моделью автомобиля ищутся только детали
+        self.assertEqual(self.found(q='camry', car_model_id=self.car_model.pk), [])
+
+    def test_types_and_limit(self):
+        self.assertEqual(self.found(q='r1', types='discs'), [('discs', self.discs.pk)])
+        self.assertEqual(self.found(q='spoiler', types='discs'), [])
+        self.assertEqual(len(self.found(q='spoiler', limit=1)), 1)
+
+    def test_invalid_params(self):
+        for params in (
+            {'q': 's'},
+            {'q': 'spoiler', 'car_model_id': 'abc'},
+            {'q': 'spoiler', 'types': 'wing'},
+            {'q': 'spoiler', 'car_model_id': self.car_model.pk, 'types': 'model'},
+            {'q': 'spoiler', 'limit': 0},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.search(**params).status_code, 400)
+
+
+class ComingSoonFlagsTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ComingSoon.objects.create(content_object=cls.other_model, coming_soon=True)
+        ComingSoon.objects.create(content_object=cls.spoiler, coming_soon=False)
+        ComingSoon.objects.create(content_object=cls.discs, coming_soon=True)
+
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.get_for_models(CarModel, *PART_MODELS)
+
+    def test_list_flags_loaded_in_one_query(self):
+        car_models = list(CarModel.objects.select_related('brand').order_by('pk'))
+        with self.assertNumQueries(1):
+            data = CarModelSerializer(car_models, many=True).data
+        self.assertEqual([item['coming_soon'] for item in data], [False, True, False])
+
+    def test_mixed_models_share_one_query(self):
+        with self.assertNumQueries(1):
+            flags = resolve_coming_soon([self.car_model, self.other_model, self.spoiler, self.discs])
+        self.assertEqual(flags, {
+            (CarModel, self.car_model.pk): False,
+            (CarModel, self.other_model.pk): True,
+            (Spoiler, self.spoiler.pk): False,
+            (Discs, self.discs.pk): True,
+        })
+
+
+class BrandModelCountTest(CatalogTestCase):
+    def test_brand_list_counts_in_one_query(self):
+        url = reverse('carbrand-list')
+        with self.assertNumQueries(1):
+            data = self.client.get(url).json()
+        self.assertEqual(data[0]['model_count'], 3)
+
+        for number in range(3):
+            brand = CarBrand.objects.create(name=f'Brand {number}', logo='brands/logos/brand.png')
+            CarModel.objects.create(brand=brand, name=f'Model {number}')
+        with self.assertNumQueries(1):
+            data = self.client.get(url).json()
+        self.assertEqual([brand['model_count'] for brand in data], [3, 1, 1, 1])
+
+    def test_nested_brand_count(self):
+        data = self.client.get(reverse('carmodel-detail', args=[self.car_model.pk])).json()
+        self.assertEqual(data['brand']['model_count'], 3)
+        list_data = self.client.get(reverse('carmodel-list'), {'fields': 'brand'}).json()['results']
+        self.assertEqual({item['brand']['model_count'] for item in list_data}, {3})
+
+
+class CatalogExportTest(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        ContentType.objects.get_for_models(CarModel, *PART_MODELS)
+
+    def export(self, output):
+        response = self.client.get(reverse('catalog-export'), {'output': output})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_json_matches_list_endpoints(self):
+        data = json.loads(self.export('json'))
+
+        self.assertEqual(set(data), {'brands', 'models', *COMPATIBLE_PARTS})
+        self.assertEqual(data['brands'], self.client.get(reverse('carbrand-list')).json())
+        models = self.client.get(reverse('carmodel-list'), {'expand': ''}).json()['results']
+        self.assertEqual(data['models'], models)
+
+        spoilers = self.client.get(reverse('spoiler-list')).json()['results']
+        compatible = {item['id']: item.pop('compatible_car_models') for item in data['spoilers']}
+        self.assertEqual(data['spoilers'], spoilers)
+        self.assertEqual(compatible, {self.spoiler.pk: [self.car_model.pk], self.other_spoiler.pk: [self.other_model.pk]})
+        self.assertEqual(data['bumpers'], [])
+
+    def test_ndjson_has_one_line_per_record(self):
+        lines = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual(
+            [(line['type'], line['data']['id']) for line in lines if line['type'] in ('models', 'discs')],
+            [('models', self.car_model.pk), ('models', self.other_model.pk), ('models', self.third_model.pk),
+             ('discs', self.discs.pk)],
+        )
+        self.assertEqual(len(lines), 1 + 3 + 3)
+
+    def test_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.export('json')
+
+        for number in range(5):
+            model = CarModel.objects.create(brand=self.brand, name=f'Model {number}')
+            Spoiler.objects.create(name=f'Spoiler {number}', model_3d='parts/3d_models/spoiler.glb')
+            self.discs.compatible_car_models.add(model)
+        with self.assertNumQueries(len(queries)):
+            data = json.loads(self.export('json'))
+        self.assertEqual((len(data['models']), len(data['spoilers'])), (8, 7))
+
+    def test_unknown_output(self):
+        response = self.client.get(reverse('catalog-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TemporaryMediaMixin:
+    """Файлы теста во временном MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        assets._digests.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = self.settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MediaTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+@override_settings(ASSET_SENDFILE='')
+class AssetServingTest(MediaTestCase):
+    name = 'parts/3d_models/spoiler.glb'
+    data = b''.join(f'vertex {number};'.encode() for number in range(200))
+
+    def setUp(self):
+        super().setUp()
+        default_storage.save(self.name, ContentFile(self.data))
+        self.digest = file_digest(self.name)
+        self.url = reverse('catalog-asset', kwargs={'digest': self.digest, 'name': self.name})
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.data)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertEqual(response['Content-Type'], 'model/gltf-binary')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_ranges(self):
+        size = len(self.data)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), self.data[:10])
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), self.data[-5:])
+        self.assertEqual(response['Content-Range'], f'bytes {size - 5}-{size - 1}/{size}')
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.data)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=f'"{self.digest}"')
+        self.assertEqual(response.status_code, 206)
+
+    def test_encoded_variant(self):
+        size, variants = build_variants(self.name)
+        self.assertIn('gzip', variants)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'"{self.digest}-gzip"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(zlib.decompress(self.content(response), 31), self.data)
+
+        # ETag несжатого файла не подходит для сжатого варианта
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=f'"{self.digest}"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.digest}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+
+    def test_digest_mismatch(self):
+        url = reverse('catalog-asset', kwargs={'digest': '0' * 16, 'name': self.name})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        default_storage.delete(self.name)
+        default_storage.save(self.name, ContentFile(b'changed'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(ASSET_SENDFILE='x-accel-redirect', ASSET_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_sendfile_offload(self):
+        build_variants(self.name)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.name)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertEqual(response.content, b'')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=-5', 100), (95, 99))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+        self.assertIsNone(parse_range('bytes=9-0', 100))
+
+
+class FastJSONRendererTest(TestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_line_separators_escaped(self):
+        data = {'name': 'Spoiler\u2028GT\u2029', 'description': 'Обвес «Бэтмен»'}
+        rendered = FastJSONRenderer().render(data)
+        self.assertIn(b'Spoiler\\u2028GT\\u2029', rendered)
+        self.assertIn('«Бэтмен»'.encode(), rendered)
+        self.assertSameBytes(data)
+
+    def test_types_match_json_renderer(self):
+        moment = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        self.assertSameBytes({
+            'price': Decimal('1999.90'),
+            'created_at': moment,
+            'naive': moment.replace(tzinfo=None),
+            'date': moment.date(),
+            'time': moment.time(),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'items': [{1: 'a'}, None, True, 1.5],
+        })
+
+    def test_indent_falls_back(self):
+        data = {'name': 'Camry'}
+        rendered = FastJSONRenderer().render(data, 'application/json; indent=2')
+        self.assertEqual(rendered, JSONRenderer().render(data, 'application/json; indent=2'))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class CompressionTest(MediaTestCase):
+    name = 'parts/3d_models/spoiler.gltf'
+    data = b''.join(f'{{"vertex": {number}}},'.encode() for number in range(500))
+
+    def test_variants_stored_next_to_file(self):
+        default_storage.save(self.name, ContentFile(self.data))
+
+        size, variants = build_variants(self.name)
+
+        self.assertEqual(size, len(self.data))
+        self.assertEqual(set(variants), {encoding for encoding, suffix, compressor in ENCODINGS})
+        for encoding, suffix, compressor in ENCODINGS:
+            self.assertEqual(default_storage.size(self.name + suffix), variants[encoding])
+            self.assertLess(variants[encoding], size * 0.9)
+        with default_storage.open(self.name + '.gz') as file:
+            self.assertEqual(zlib.decompress(file.read(), 31), self.data)
+
+        cache.clear()
+        self.assertEqual(get_variants(self.name), variants)
+
+    def test_incompressible_data_not_stored(self):
+        default_storage.save(self.name, ContentFile(os.urandom(4096)))
+
+        size, variants = build_variants(self.name)
+
+        self.assertEqual(variants, {})
+        self.assertFalse(default_storage.exists(self.name + '.gz'))
+
+    def test_pick_encoding(self):
+        variants = {'br': 10, 'gzip': 20}
+        self.assertEqual(pick_encoding(variants, 'gzip, br'), 'br')
+        self.assertEqual(pick_encoding(variants, 'gzip, br;q=0'), 'gzip')
+        self.assertEqual(pick_encoding(variants, '*'), 'br')
+        self.assertIsNone(pick_encoding(variants, 'identity'))
+        self.assertIsNone(pick_encoding(variants, ''))
+        self.assertIsNone(pick_encoding({}, 'gzip'))
+
+
+class DerivativeInvalidationTest(TemporaryMediaMixin, CatalogTestCase):
+    name = 'cars/preview/camry.png'
+
+    def setUp(self):
+        super().setUp()
+        buffer = BytesIO()
+        Image.new('RGB', (640, 320), (200, 30, 30)).save(buffer, format='PNG')
+        default_storage.save(self.name, ContentFile(buffer.getvalue()))
+        CarModel.objects.filter(pk=self.car_model.pk).update(preview_image=self.name)
+
+    def test_responses_dropped_when_derivatives_ready(self):
+        url = reverse('carmodel-detail', args=[self.car_model.pk])
+        list_url = reverse('carmodel-list')
+        with mock.patch('car_tuning.images.run_in_background') as run_in_background:
+            response = self.client.get(url)
+            list_etag = self.client.get(list_url)['ETag']
+        self.assertIsNone(response.json()['preview_image_set'])
+        run_in_background.assert_any_call(build_and_cache, self.name)
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+
+        # Фоновая сборка идёт вне транзакции теста, маркер каталога меняется сразу
+        with self.captureOnCommitCallbacks(execute=True):
+            build_and_cache(self.name)
+
+        image_set = self.client.get(url).json()['preview_image_set']
+        self.assertEqual(image_set['card']['width'], 480)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        camry = next(item for item in response.json()['results'] if item['id'] == self.car_model.pk)
+        self.assertEqual(camry['preview_image_set'], image_set)
+
+    def test_owner_car_models(self):
+        Spoiler.objects.filter(pk=self.spoiler.pk).update(image='parts/images/gt.png')
+        Discs.objects.filter(pk=self.discs.pk).update(image='parts/images/gt.png')
+
+        self.assertEqual(owner_car_model_ids(self.name), {self.car_model.pk})
+        self.assertEqual(owner_car_model_ids('parts/images/gt.png'), {self.car_model.pk, self.other_model.pk})
+        self.assertEqual(
+            owner_car_model_ids(self.brand.logo.name),
+            {self.car_model.pk, self.other_model.pk, self.third_model.pk},
+        )
+        self.assertEqual(owner_car_model_ids('parts/images/unused.png'), set())
+
+
+class InlineExecutor(Executor):
+    """Вместо пула процессов: задачи выполняются сразу, в том же соединении с базой."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+# Снимок собирается после коммита данных: команда закрывает соединения перед пулом
+@override_settings(CACHES=TEST_CACHES, CATALOG_SNAPSHOT_URL='/catalog-snapshots/')
+class CatalogSnapshotTest(TemporaryMediaMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        car_model_cache.local.clear()
+        snapshots._manifest.update(version=None, data=None)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        snapshot_root = self.settings(CATALOG_SNAPSHOT_ROOT=self.root)
+        snapshot_root.enable()
+        self.addCleanup(snapshot_root.disable)
+
+        # Файлов нет в хранилище — сжатие и копии после коммита не нужны
+        with mock.patch('car_tuning.signals.schedule_variants'), mock.patch('car_tuning.signals.schedule_derivatives'):
+            brand = CarBrand.objects.create(name='Toyota', logo='brands/logos/toyota.svg')
+            self.car_model = CarModel.objects.create(brand=brand, name='Camry')
+            CarModel.objects.create(brand=brand, name='Corolla')
+            spoiler = Spoiler.objects.create(name='Spoiler GT', model_3d='parts/3d_models/spoiler.glb')
+            spoiler.compatible_car_models.add(self.car_model)
+            Color.objects.create(name='Белый', hex_code='#FFFFFF')
+
+        self.build_snapshot()
+
+    def build_snapshot(self):
+        with mock.patch(
+            'car_tuning.management.commands.build_catalog_snapshot.ProcessPoolExecutor', InlineExecutor
+        ):
+            call_command('build_catalog_snapshot', base_url='http://testserver', workers=1, stdout=StringIO())
+        self.manifest = snapshots.current_manifest()
+
+    def api_content(self, path):
+        with self.settings(CATALOG_SNAPSHOT_MODE=''):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_snapshot_files(self):
+        compatible_parts = f'models/{self.car_model.pk}/compatible_parts.json'
+        self.assertEqual(
+            set(self.manifest['files']),
+            {'brands.json', 'models.json', 'colors.json', compatible_parts,
+             f'models/{self.car_model.pk + 1}/compatible_parts.json'},
+        )
+        self.assertEqual(self.manifest['base_url'], 'http://testserver/')
+        directory = os.path.join(self.root, 'current')
+        with open(os.path.join(directory, 'brands.json'), 'rb') as file:
+            self.assertEqual(file.read(), self.api_content('/api/brands/'))
+        with open(os.path.join(directory, compatible_parts), 'rb') as file:
+            self.assertEqual(file.read(), self.api_content(f'/api/models/{self.car_model.pk}/compatible_parts/'))
+
+    @override_settings(CATALOG_SNAPSHOT_MODE='redirect')
+    def test_redirect_mode(self):
+        response = self.client.get('/api/brands/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f"/catalog-snapshots/{self.manifest['version']}/brands.json")
+
+        # С параметрами запрос обрабатывает API
+        self.assertEqual(self.client.get('/api/brands/', {'fields': 'id'}).status_code, 200)
+
+    @override_settings(CATALOG_SNAPSHOT_MODE='serve')
+    def test_serve_mode(self):
+        path = f'/api/models/{self.car_model.pk}/compatible_parts/'
+        expected = self.api_content(path)
+
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), expected)
+        self.assertEqual(response['ETag'], f'"{self.manifest["version"]}"')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        if 'gzip' in self.manifest['files'][snapshots.snapshot_name(path)]:
+            response = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(zlib.decompress(b''.join(response.streaming_content), 31), expected)
+
+    @override_settings(CATALOG_SNAPSHOT_MODE='redirect')
+    def test_falls_back_after_catalog_change(self):
+        self.assertEqual(self.client.get('/api/brands/').status_code, 302)
+
+        touch_catalog()
+
+        response = self.client.get('/api/brands/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'Toyota')
+
+    @override_settings(CATALOG_SNAPSHOT_MODE='redirect', ALLOWED_HOSTS=['*'])
+    def test_other_host_not_served(self):
+        self.assertEqual(self.client.get('/api/brands/', HTTP_HOST='example.com').status_code, 200)
+
+    @override_settings(CATALOG_SNAPSHOT_MODE='redirect')
+    def test_derivatives_built_before_snapshot(self):
+        buffer = BytesIO()
+        Image.new('RGB', (640, 320), (200, 30, 30)).save(buffer, format='PNG')
+        default_storage.save('cars/preview/camry.png', ContentFile(buffer.getvalue()))
+        CarModel.objects.filter(pk=self.car_model.pk).update(preview_image='cars/preview/camry.png')
+
+        self.build_snapshot()
+
+        with open(os.path.join(self.root, 'current', 'models.json')) as file:
+            camry = next(item for item in json.load(file)['results'] if item['id'] == self.car_model.pk)
+        self.assertEqual(camry['preview_image_set']['thumb']['width'], 96)
+        self.assertEqual(self.client.get('/api/models/').status_code, 302)
+
+
+# Async-представления читают базу из других потоков, поэтому данные должны быть закоммичены
+@override_settings(CACHES=TEST_CACHES)
+class AsyncViewsTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        car_model_cache.local.clear()
+        # Семафор привязывается к циклу событий, а у каждого теста он свой
+        patcher = mock.patch.object(async_views, 'db_slots', asyncio.Semaphore(2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        with mock.patch('car_tuning.signals.schedule_variants'), mock.patch('car_tuning.signals.schedule_derivatives'):
+            brand = CarBrand.objects.create(name='Toyota', logo='brands/logos/toyota.svg')
+            self.car_model = CarModel.objects.create(brand=brand, name='Camry')
+            spoiler = Spoiler.objects.create(name='Spoiler GT', model_3d='parts/3d_models/spoiler.glb')
+            spoiler.compatible_car_models.add(self.car_model)
+            discs = Discs.objects.create(name='Discs R18', model_3d='parts/3d_models/discs.glb')
+            discs.compatible_car_models.add(self.car_model)
+            ComingSoon.objects.create(content_object=discs, coming_soon=True)
+            Color.objects.create(name='Белый', hex_code='#FFFFFF')
+
+    async def assertSameAsSync(self, async_name, sync_name, params=None):
+        pk = self.car_model.pk
+        async_response = await self.async_client.get(reverse(async_name, args=[pk]), params or {})
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response['X-Cache'], MISS)
+
+        await sync_to_async(cache.clear)()
+        car_model_cache.local.clear()
+        sync_response = await sync_to_async(self.client.get)(reverse(sync_name, args=[pk]), params or {})
+        self.assertEqual(sync_response['X-Cache'], MISS)
+        self.assertEqual(json.loads(async_response.content), sync_response.json())
+
+    async def test_detail_matches_sync_view(self):
+        await self.assertSameAsSync('async-carmodel-detail', 'carmodel-detail')
+        await self.assertSameAsSync('async-carmodel-detail', 'carmodel-detail', {'fields': 'id,name', 'expand': 'spoilers'})
+
+    async def test_compatible_parts_match_sync_view(self):
+        await self.assertSameAsSync('async-carmodel-compatible-parts', 'carmodel-compatible-parts')
+
+    async def test_unknown_model(self):
+        response = await self.async_client.get(reverse('async-carmodel-detail', args=[self.car_model.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CollectMediaGarbageTest(MediaTestCase):
+    model_blob = f"blobs/aa/{'a' * 64}.glb"
+    preview_blob = f"blobs/bb/{'b' * 64}.png"
+    unused_blob = f"blobs/cc/{'c' * 64}.png"
+
+    def setUp(self):
+        super().setUp()
+        brand = CarBrand.objects.create(name='Toyota', logo=self.preview_blob)
+        CarModel.objects.create(brand=brand, name='Camry', model_3d=self.model_blob, preview_image=self.preview_blob)
+        self.kept = [
+            self.model_blob,
+            self.model_blob + '.gz',
+            self.preview_blob,
+            f"derivatives/blobs/bb/{'b' * 64}/thumb.webp",
+        ]
+        self.removed = [
+            self.unused_blob,
+            self.unused_blob + '.gz',
+            f"derivatives/blobs/cc/{'c' * 64}/thumb.webp",
+            'cars/3d_models/camry_old.glb',
+        ]
+        for name in self.kept + self.removed:
+            default_storage.save(name, ContentFile(b'data'))
+
+    def collect(self, *args):
+        output = StringIO()
+        call_command('collect_media_garbage', *args, stdout=output)
+        return output.getvalue()
+
+    def test_unreferenced_files_removed(self):
+        output = self.collect('--grace', '0')
+
+        self.assertEqual([name for name in self.kept if not default_storage.exists(name)], [])
+        self.assertEqual([name for name in self.removed if default_storage.exists(name)], [])
+        self.assertIn('Файлов: 4', output)
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.collect('--grace', '0', '--dry-run')
+
+        self.assertEqual([name for name in self.kept + self.removed if not default_storage.exists(name)], [])
+        self.assertIn(f'будет удалён: {self.unused_blob}', output)
+        self.assertIn('Файлов: 4', output)
+
+    def test_recent_files_kept(self):
+        self.collect()
+        self.assertEqual([name for name in self.kept + self.removed if not default_storage.exists(name)], [])
+
+
+class DatabasePoolStatsTest(CatalogTestCase):
+    def test_admin_only(self):
+        url = reverse('db-pool-stats')
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.client.force_authenticate(User.objects.create_user('driver'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json())
@@ -4,8 +4,11 @@ from .views import (
     CarBrandViewSet, CarModelViewSet,
     SpoilerViewSet, DiscsViewSet, RestylingViewSet,
     BumperViewSet, RearBumperViewSet, SideSkirtViewSet,
-    TintingViewSet, ColorViewSet, UserCarCustomizationViewSet
+    TintingViewSet, ColorViewSet, UserCarCustomizationViewSet,
+    CatalogExportView, CatalogSearchView, DatabasePoolStatsView
 )
+from .assets import serve_asset
+from .async_views import car_model_detail, car_model_compatible_parts
 
 router = DefaultRouter()
 router.register(r'brands', CarBrandViewSet)
@@ -21,5 +24,15 @@ router.register(r'colors', ColorViewSet)
 router.register(r'customizations', UserCarCustomizationViewSet, basename='customization')
 
 urlpatterns = [
+    path('export/', CatalogExportView.as_view(), name='catalog-export'),
+    path('search/', CatalogSearchView.as_view(), name='catalog-search'),
+    path('db-pool-stats/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('assets/<str:digest>/<path:name>', serve_asset, name='catalog-asset'),
+    # Async-версии для ASGI (см. async_views.py)
+    path('async/models/<int:pk>/', car_model_detail, name='async-carmodel-detail'),
+    path(
+        'async/models/<int:pk>/compatible_parts/', car_model_compatible_parts,
+        name='async-carmodel-compatible-parts'
+    ),
     path('', include(router.urls)),
 ]
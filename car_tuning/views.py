@@ -1,9 +1,13 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 
 from .models import (
     CarBrand, CarModel, Spoiler, Discs, Restyling, Bumper,
@@ -14,96 +18,168 @@ from .serializers import (
     SpoilerSerializer, DiscsSerializer, RestylingSerializer, BumperSerializer,
     RearBumperSerializer, SideSkirtSerializer, TintingSerializer, ColorSerializer,
     UserCarCustomizationListSerializer, UserCarCustomizationDetailSerializer,
-    UserCarCustomizationUpdateSerializer
+    UserCarCustomizationUpdateSerializer, UserCarCustomizationPartsSerializer,
+    UserCarCustomizationDeltaSerializer, CUSTOMIZATION_PART_MODELS
 )
+from .loaders import COMPATIBLE_PARTS, load_compatible_parts, load_colors
+from .autosave import autosave_buffer, apply_changes
+from .cache import STALE, car_model_cache, request_variant
+from .compatibility import compatibility_index
+from .conditional import catalog_condition, mark_stale
+from .dbpool import pool_stats
+from .fieldsets import FieldSelection
+from .pagination import CarModelPagination, PartPagination, CustomizationPagination
+from .export import stream_ndjson, stream_json
+from .search import search_catalog
+
+
+class FastListMixin:
+    """
+    list() через быстрый путь сериализации (см. fastpath.py): строки читаются
+    через .values() и сериализуются по плану полей. Если для сериализатора
+    план не строится, используется обычный list().
+    """
+
+    def get_fast_plan(self):
+        return self.get_serializer_class().get_fast_plan()
+
+    def extend_list_data(self, data):
+        return data
 
+    def list(self, request, *args, **kwargs):
+        plan = self.get_fast_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
 
-class CarBrandViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CarBrand.objects.all().annotate(model_count=Count('models'))
-    serializer_class = CarBrandSerializer
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = plan.values(queryset, extra=getattr(self.paginator, 'ordering', None) or ())
+        page = self.paginate_queryset(rows)
+        data = plan.serialize(rows if page is None else page, self.get_serializer_context())
+        data = self.extend_list_data(data)
 
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
-class CarModelViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CarModel.objects.select_related('brand').all()
-    serializer_class = CarModelSerializer
+
+class FieldSelectionMixin:
+    """
+    ?fields= и ?expand= (см. fieldsets.py): выбор полей передаётся
+    сериализатору и плану быстрого пути, группы — загрузке данных вьюсета.
+    """
+    # Постоянные аргументы сериализатора вьюсета
+    serializer_kwargs = {}
+
+    def get_selectable_fields(self):
+        """(поля сериализатора, дозагружаемые группы), из которых выбирает клиент."""
+        return self.get_serializer_class().get_field_names_for(**self.serializer_kwargs), ()
+
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            field_names, group_names = self.get_selectable_fields()
+            self._field_selection = FieldSelection.from_request(self.request, field_names, group_names)
+        return self._field_selection
 
     def get_serializer(self, *args, **kwargs):
-        kwargs['detail'] = True
+        kwargs.update(self.serializer_kwargs, fields=self.get_field_selection().fields)
         return super().get_serializer(*args, **kwargs)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
-        response_data = []
+    def get_fast_plan(self):
+        return self.get_serializer_class().get_fast_plan(
+            **self.serializer_kwargs, fields=self.get_field_selection().fields
+        )
 
-        if page is not None:
-            for model in page:
-                serializer = self.get_serializer(model)
-                model_data = serializer.data
-                compatible_parts = self.get_compatible_parts(model)
-                for key, value in compatible_parts.items():
-                    if key != 'colors':
-                        model_data[key] = value
-                response_data.append(model_data)
-            return self.get_paginated_response(response_data)
-
-        for model in queryset:
-            serializer = self.get_serializer(model)
-            model_data = serializer.data
-            compatible_parts = self.get_compatible_parts(model)
-            for key, value in compatible_parts.items():
-                if key != 'colors':
-                    model_data[key] = value
-            response_data.append(model_data)
-
-        return Response(response_data)
+
+@method_decorator(catalog_condition, name='dispatch')
+class CarBrandViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = CarBrand.objects.with_model_count()
+    serializer_class = CarBrandSerializer
+
+
+@method_decorator(catalog_condition, name='dispatch')
+class CarModelViewSet(FieldSelectionMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    # Бренды подгружаются одним запросом вместе с количеством моделей
+    queryset = CarModel.objects.prefetch_related(
+        Prefetch('brand', queryset=CarBrand.objects.with_model_count())
+    )
+    serializer_class = CarModelSerializer
+    serializer_kwargs = {'detail': True}
+    pagination_class = CarModelPagination
+
+    def get_queryset(self):
+        fields = self.get_field_selection().fields
+        if self.action == 'compatible_parts' or (fields is not None and 'brand' not in fields):
+            # Ответу бренд не нужен
+            return CarModel.objects.all()
+        return super().get_queryset()
+
+    def get_selectable_fields(self):
+        if self.action == 'compatible_parts':
+            return ('colors',), tuple(COMPATIBLE_PARTS)
+        field_names, group_names = super().get_selectable_fields()
+        return field_names, tuple(COMPATIBLE_PARTS)
+
+    def extend_list_data(self, data):
+        groups = self.get_field_selection().groups
+        if not groups:
+            return data
+        compatible_parts = load_compatible_parts([model_data['id'] for model_data in data], groups)
+        for model_data in data:
+            model_data.update(compatible_parts[model_data['id']])
+        return data
 
     def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response('detail', self.build_detail)
+
+    def build_detail(self):
         instance = self.get_object()
-        compatible_parts = self.get_compatible_parts(instance)
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        for key, value in compatible_parts.items():
-            if key != 'colors':
-                data[key] = value
-        return Response(data)
+        data = self.get_serializer(instance).data
+        data.update(load_compatible_parts([instance.pk], self.get_field_selection().groups)[instance.pk])
+        return data
 
     def get_compatible_parts(self, car_model):
-        mapping = {
-            'spoilers': (Spoiler, SpoilerSerializer),
-            'discs': (Discs, DiscsSerializer),
-            'restylings': (Restyling, RestylingSerializer),
-            'bumpers': (Bumper, BumperSerializer),
-            'rear_bumpers': (RearBumper, RearBumperSerializer),
-            'side_skirts': (SideSkirt, SideSkirtSerializer),
-            'tintings': (Tinting, TintingSerializer),
-        }
-        data = {}
-        for key, (model_cls, serializer_cls) in mapping.items():
-            parts_qs = model_cls.objects.filter(
-                compatible_car_models=car_model
-            ).order_by('order')
-            data[key] = serializer_cls(parts_qs, many=True).data
-
-        colors = Color.objects.all().order_by('order')
-        data['colors'] = ColorSerializer(colors, many=True).data
+        selection = self.get_field_selection()
+        data = load_compatible_parts([car_model.pk], selection.groups)[car_model.pk]
+        if selection.fields is None or 'colors' in selection.fields:
+            data['colors'] = load_colors()
         return data
 
+    def get_cached_response(self, kind, build):
+        """
+        Отдаёт ответ из кэша по модели автомобиля; build() собирает его при промахе.
+        Кэш сбрасывается сигналами (см. signals.py).
+        """
+        lookup = str(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if not lookup.isdigit():
+            return Response(build())
+
+        kind = self.get_field_selection().cache_kind(kind)
+        data, state = car_model_cache.get_or_build(int(lookup), kind, request_variant(self.request), build)
+        response = Response(data)
+        response['X-Cache'] = state
+        if state == STALE:
+            mark_stale(response)
+        return response
+
     @action(detail=True, methods=['get'])
     def compatible_parts(self, request, pk=None):
-        car_model = self.get_object()
-        data = self.get_compatible_parts(car_model)
-        return Response(data)
+        return self.get_cached_response(
+            'compatible_parts', lambda: self.get_compatible_parts(self.get_object())
+        )
 
 
-class BasePartViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(catalog_condition, name='dispatch')
+class BasePartViewSet(FieldSelectionMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    pagination_class = PartPagination
     compatible_param = 'car_model_id'
 
     def get_queryset(self):
         qs = super().get_queryset()
         cm_id = self.request.query_params.get(self.compatible_param)
         if cm_id:
-            qs = qs.filter(compatible_car_models__id=cm_id)
+            if not cm_id.isdigit():
+                return qs.none()
+            qs = qs.filter(pk__in=compatibility_index.part_ids(qs.model, int(cm_id)))
         return qs
 
 
@@ -142,25 +218,79 @@ class TintingViewSet(BasePartViewSet):
     serializer_class = TintingSerializer
 
 
-class ColorViewSet(viewsets.ReadOnlyModelViewSet):
+@method_decorator(catalog_condition, name='dispatch')
+class ColorViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Color.objects.all().order_by('order')
     serializer_class = ColorSerializer
 
 
+@method_decorator(catalog_condition, name='dispatch')
+class CatalogExportView(APIView):
+    """
+    Потоковая выгрузка всего каталога: бренды, модели и все детали
+    с id совместимых моделей. ?output=ndjson (по умолчанию) или ?output=json.
+    """
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output == 'json':
+            response = StreamingHttpResponse(stream_json(request), content_type='application/json')
+        elif output == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(request), content_type='application/x-ndjson')
+        else:
+            return Response(
+                {'error': f'Неизвестный формат выгрузки: {output}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        response['Content-Disposition'] = f'attachment; filename="catalog.{output}"'
+        return response
+
+
+@method_decorator(catalog_condition, name='dispatch')
+class CatalogSearchView(APIView):
+    """
+    Поиск брендов, моделей и деталей по названию (см. search.py):
+    ?q=, ?car_model_id=, ?types=, ?limit=.
+    """
+
+    def get(self, request, *args, **kwargs):
+        return Response({'results': search_catalog(request)})
+
+
+class DatabasePoolStatsView(APIView):
+    """Метрики пула соединений процесса (см. dbpool.py). ?reset=1 обнуляет счётчики."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(pool_stats(reset=request.query_params.get('reset') == '1'))
+
+
 class UserCarCustomizationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = CustomizationPagination
+    # Действия, перед которыми записывается буфер автосохранения (см. autosave.py)
+    WRITE_ACTIONS = ('update', 'partial_update', 'destroy', 'update_part', 'update_parts', 'commit')
 
     def get_queryset(self):
-        return (
+        queryset = (
             UserCarCustomization.objects
             .filter(user=self.request.user)
             .select_related(
-                'car_model', 'car_model__brand',
+                'car_model',
                 'color', 'tinting', 'spoiler', 'discs',
                 'restyling', 'bumper', 'rear_bumper', 'side_skirt'
             )
             .order_by('-updated_at')
         )
+        if self.action == 'list':
+            return queryset.select_related('car_model__brand')
+        if self.action in ('update', 'partial_update') or self.wants_delta() or self.autosave_requested():
+            # Ответ UpdateSerializer и краткий ответ не выводят бренд
+            return queryset
+        # Детальное представление выводит бренд вместе с количеством моделей
+        return queryset.prefetch_related(
+            Prefetch('car_model__brand', queryset=CarBrand.objects.with_model_count())
+        )
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -172,6 +302,78 @@ class UserCarCustomizationViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def get_object(self):
+        customization = autosave_buffer.overlay(super().get_object())
+        if self.action in self.WRITE_ACTIONS and not self.autosave_requested():
+            # Обычная запись не должна потерять изменения из буфера автосохранения
+            updated_at = autosave_buffer.flush(customization.pk)
+            if updated_at is not None:
+                customization.updated_at = updated_at
+        return customization
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            autosave_buffer.overlay_many(page)
+        return page
+
+    def autosave_requested(self):
+        return self.request.query_params.get('autosave') in ('1', 'true')
+
+    def autosave_response(self, customization, changes):
+        """
+        Кладёт изменения в буфер автосохранения вместо записи в базу.
+        202 — изменения ждут записи, 200 — буфер уже записан по порогу.
+        """
+        updated_at = autosave_buffer.stage(customization.pk, changes)
+        apply_changes(customization, changes)
+        if updated_at is not None:
+            customization.updated_at = updated_at
+
+        data = UserCarCustomizationDeltaSerializer(customization, fields=changes).data
+        data['pending'] = updated_at is None
+        return Response(data, status=status.HTTP_202_ACCEPTED if data['pending'] else status.HTTP_200_OK)
+
+    def wants_delta(self):
+        """
+        Краткий ответ на запись (только изменённые поля и updated_at):
+        ?response=delta или заголовок Prefer: return=minimal.
+        """
+        if self.request.query_params.get('response') == 'delta':
+            return True
+        return self.prefers_minimal()
+
+    def prefers_minimal(self):
+        preferences = self.request.headers.get('Prefer', '').split(',')
+        return 'return=minimal' in (item.split(';')[0].strip().lower() for item in preferences)
+
+    def delta_response(self, customization, fields):
+        response = Response(UserCarCustomizationDeltaSerializer(customization, fields=fields).data)
+        if self.prefers_minimal():
+            response['Preference-Applied'] = 'return=minimal'
+        return response
+
+    def update(self, request, *args, **kwargs):
+        if not (self.wants_delta() or self.autosave_requested()):
+            return super().update(request, *args, **kwargs)
+
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        if self.autosave_requested():
+            return self.autosave_response(instance, serializer.validated_data)
+        self.perform_update(serializer)
+        return self.delta_response(instance, serializer.validated_data)
+
+    @staticmethod
+    def is_compatible_id(part_model, part_id, car_model_id):
+        try:
+            part_id = int(part_id)
+        except (TypeError, ValueError):
+            return False
+        return part_id in compatibility_index.part_ids(part_model, car_model_id)
+
     @action(detail=True, methods=['patch'])
     def update_part(self, request, pk=None):
         customization = self.get_object()
@@ -184,25 +386,57 @@ class UserCarCustomizationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        mapping = {
-            'spoiler': Spoiler, 'discs': Discs,
-            'restyling': Restyling, 'bumper': Bumper,
-            'rear_bumper': RearBumper, 'side_skirt': SideSkirt,
-            'tinting': Tinting, 'color': Color,
-        }
-        cls = mapping.get(part_type)
+        cls = CUSTOMIZATION_PART_MODELS.get(part_type)
         if cls is None:
             return Response(
                 {'error': f'Неизвестный тип детали: {part_type}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        lookup = {'id': part_id}
-        if cls is not Color:
-            lookup['compatible_car_models'] = customization.car_model
-
-        new_part = get_object_or_404(cls, **lookup) if part_id else None
+        new_part = None
+        if part_id:
+            # Совместимость проверяется по индексу в памяти, без JOIN по M2M
+            if cls is not Color and not self.is_compatible_id(cls, part_id, customization.car_model_id):
+                raise Http404
+            new_part = get_object_or_404(cls, id=part_id)
+        if self.autosave_requested():
+            return self.autosave_response(customization, {part_type: new_part})
         setattr(customization, part_type, new_part)
-        customization.save()
+        customization.save(update_fields=[part_type, 'updated_at'])
 
+        if self.wants_delta():
+            return self.delta_response(customization, [part_type])
         return Response(UserCarCustomizationDetailSerializer(customization).data)
+
+    @action(detail=True, methods=['patch'])
+    def update_parts(self, request, pk=None):
+        """
+        Замена нескольких деталей одним запросом: {"parts": {"bumper": 1, "discs": 4, "color": 2}}.
+        Все детали проверяются вместе, запись — одним UPDATE в транзакции.
+        """
+        if self.autosave_requested():
+            customization = self.get_object()
+            serializer = UserCarCustomizationPartsSerializer(customization, data=request.data)
+            serializer.is_valid(raise_exception=True)
+            return self.autosave_response(customization, serializer.validated_data['parts'])
+
+        with transaction.atomic():
+            customization = self.get_object()
+            serializer = UserCarCustomizationPartsSerializer(customization, data=request.data)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        if self.wants_delta():
+            return self.delta_response(customization, serializer.validated_data['parts'])
+
+        # Поля деталей заменены на id — перечитываем кастомизацию со всеми связями
+        customization = self.get_queryset().get(pk=customization.pk)
+        return Response(
+            UserCarCustomizationDetailSerializer(customization, context=self.get_serializer_context()).data
+        )
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        """Немедленная запись буфера автосохранения в базу."""
+        customization = self.get_object()
+        return Response(self.get_serializer(customization).data)